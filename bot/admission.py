@@ -0,0 +1,209 @@
+"""
+Admission control for translation work in the NinjaTranslate bot.
+
+Translation requests to X.AI API are admitted up to a limit of in-flight
+requests. Interactive requests wait in a bounded queue for a limited
+time. Background work is limited to a share of the slots and waits in
+its own queue, served only when no interactive request is waiting.
+Speculative work is shed as soon as its share is used up. After repeated
+upstream failures the bot switches to a degraded mode for a while,
+answering only from the translation memory.
+"""
+import asyncio
+import logging
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from config import config
+
+# Work priorities
+INTERACTIVE = 0
+BACKGROUND = 1
+SPECULATIVE = 2
+
+# Priority of translation work started in the current task
+_level: ContextVar = ContextVar("admission_level", default=INTERACTIVE)
+
+class Overloaded(Exception):
+    """
+    Raised when translation work is rejected to protect the bot.
+    """
+
+@contextmanager
+def _priority(level: int):
+    """
+    Admit translation work started inside the block with the given priority.
+
+    Tasks created inside the block inherit the priority.
+
+    Args:
+        level: INTERACTIVE, BACKGROUND or SPECULATIVE
+    """
+    token = _level.set(level)
+    try:
+        yield
+    finally:
+        _level.reset(token)
+
+def background():
+    """
+    Admit translation work started inside the block as background work,
+    deferred behind interactive requests.
+    """
+    return _priority(BACKGROUND)
+
+def speculative():
+    """
+    Admit translation work started inside the block as speculative work,
+    shed as soon as the bot is busy.
+    """
+    return _priority(SPECULATIVE)
+
+class AdmissionController:
+    """
+    Bounds in-flight upstream requests and tracks upstream health.
+    """
+
+    def __init__(self):
+        self.in_flight = 0
+        self.waiters = deque()
+        self.background_waiters = deque()
+        self.failures = 0
+        self.degraded_until = 0.0
+
+    def degraded(self) -> bool:
+        """
+        Check if the upstream is considered unhealthy.
+
+        Returns:
+            True while only cached translations are served
+        """
+        return time.monotonic() < self.degraded_until
+
+    def queue_age(self) -> float:
+        """
+        Get how long the oldest queued request has been waiting.
+
+        Returns:
+            Age in seconds, 0 if nothing is queued
+        """
+        return time.monotonic() - self.waiters[0][0] if self.waiters else 0.0
+
+    def _limit(self, level: int) -> int:
+        """
+        Get the in-flight limit for a priority.
+
+        Args:
+            level: INTERACTIVE, BACKGROUND or SPECULATIVE
+
+        Returns:
+            Maximum number of in-flight requests
+        """
+        if level == INTERACTIVE:
+            return config.admission_max_in_flight
+        return int(config.admission_max_in_flight * config.admission_background_share)
+
+    def _release(self):
+        """
+        Hand the slot of a finished request to the next waiter, or free it.
+
+        Background waiters get the slot only while background work stays
+        within its share.
+        """
+        queues = [self.waiters]
+        if self.in_flight <= self._limit(BACKGROUND):
+            queues.append(self.background_waiters)
+
+        for queue in queues:
+            while queue:
+                _, future = queue.popleft()
+                if not future.done():
+                    future.set_result(None)
+                    return
+        self.in_flight -= 1
+
+    async def _wait(self, queue: deque, max_age: float):
+        """
+        Wait in a queue until a finished request hands over its slot.
+
+        Args:
+            queue: Waiter queue
+            max_age: Seconds to wait before giving up
+
+        Raises:
+            Overloaded: If no slot was handed over in time
+        """
+        waiter = (time.monotonic(), asyncio.get_running_loop().create_future())
+        future = waiter[1]
+        queue.append(waiter)
+        try:
+            await asyncio.wait_for(future, max_age)
+        except asyncio.TimeoutError:
+            if future.done() and not future.cancelled():
+                # The slot was handed over in the same tick the wait timed out
+                self._release()
+            elif waiter in queue:
+                queue.remove(waiter)
+            logging.warning(f"Request shed after waiting {max_age}s")
+            raise Overloaded("Request waited too long")
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # The slot was handed over just before cancellation
+                self._release()
+            elif waiter in queue:
+                queue.remove(waiter)
+            raise
+
+    @asynccontextmanager
+    async def admit(self):
+        """
+        Hold an upstream request slot for the duration of the block.
+
+        Raises:
+            Overloaded: If the upstream is unhealthy or the bot is saturated
+        """
+        if self.degraded():
+            raise Overloaded("Translation service is unhealthy")
+
+        level = _level.get()
+        # Background and speculative work also queue behind waiting background work
+        queued = self.waiters if level == INTERACTIVE else self.waiters or self.background_waiters
+        if self.in_flight < self._limit(level) and not queued:
+            self.in_flight += 1
+        elif level == SPECULATIVE:
+            raise Overloaded("Speculative translation shed")
+        elif level == BACKGROUND:
+            if len(self.background_waiters) >= config.admission_max_background_queue:
+                logging.warning(f"Background queue full, {self.in_flight} in flight")
+                raise Overloaded("Background queue is full")
+            await self._wait(self.background_waiters, config.admission_max_background_age)
+        elif len(self.waiters) >= config.admission_max_queue:
+            logging.warning(f"Admission queue full, {self.in_flight} in flight, oldest waiting {self.queue_age():.1f}s")
+            raise Overloaded("Admission queue is full")
+        else:
+            await self._wait(self.waiters, config.admission_max_queue_age)
+
+        try:
+            yield
+        finally:
+            self._release()
+
+    def record_result(self, success: bool):
+        """
+        Update upstream health with the outcome of a request.
+
+        Args:
+            success: Whether the request succeeded
+        """
+        if success:
+            self.failures = 0
+            return
+
+        self.failures += 1
+        if self.failures >= config.degraded_failures:
+            logging.warning(f"Translation service unhealthy, serving cached translations for {config.degraded_cooldown}s")
+            self.failures = 0
+            self.degraded_until = time.monotonic() + config.degraded_cooldown
+
+admission = AdmissionController()
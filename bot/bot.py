@@ -5,11 +5,20 @@ import logging
 from aiogram import Bot, Dispatcher
 from config import config
 from bot.handlers import router
+from bot.groups import group_router
 from bot.db import init_db
+from bot.hosting import setup_hosting, use_bot
+from bot.translations import close_session
+from bot.broadcast import resume_broadcasts
+from bot.tracing import setup_tracing, stop_tracing
+from bot.sender import setup_sender
 
 async def start_bot():
     """
-    Initialize and start the bot.
+    Initialize and start the configured bots.
+    
+    All bots are polled by one dispatcher and share the database client,
+    the X.AI session and the translation memory.
     """
     # Configure logging
     logging.basicConfig(
@@ -19,20 +28,35 @@ async def start_bot():
     
     # Validate configuration
     if not config.validate_tokens():
-        logging.error("Invalid configuration: Missing BOT_TOKEN or XAI_API_KEY")
+        logging.error("Invalid configuration: Missing BOT_TOKEN or XAI_API_KEY, or duplicate bot namespaces")
         return
     
     # Initialize database
     await init_db()
     
-    # Initialize bot and dispatcher
-    bot = Bot(token=config.bot_token)
+    # Initialize bots and dispatcher
+    hosted = [(Bot(token=bot_config.token), bot_config) for bot_config in config.bots]
+    bots = [bot for bot, _ in hosted]
     dp = Dispatcher()
     
-    # Include routers
+    # Include routers, group messages are handled before private ones
+    dp.include_router(group_router)
     dp.include_router(router)
+    setup_hosting(dp, hosted)
+    setup_tracing(dp, bots)
+    for bot in bots:
+        # Telegram rate limits apply per bot
+        setup_sender(bot)
     
     # Start polling
-    logging.info("Starting NinjaTranslate bot")
-    await bot.delete_webhook(drop_pending_updates=True)
-    await dp.start_polling(bot) 
\ No newline at end of file
+    logging.info(f"Starting NinjaTranslate with {len(bots)} bot(s)")
+    for bot, bot_config in hosted:
+        # Membership updates queued while the bot was down are still needed
+        await bot.delete_webhook(drop_pending_updates=not config.subscription_events)
+        with use_bot(bot_config):
+            await resume_broadcasts(bot)
+    try:
+        await dp.start_polling(*bots, allowed_updates=dp.resolve_used_update_types())
+    finally:
+        await close_session()
+        stop_tracing() 
\ No newline at end of file
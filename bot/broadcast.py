@@ -0,0 +1,127 @@
+"""
+Admin broadcast pipeline for the NinjaTranslate bot.
+
+Recipients are streamed from MongoDB in batches, messages are sent at bulk
+priority through the outbound sender and progress is checkpointed after
+every batch so an interrupted broadcast resumes where it stopped.
+"""
+import asyncio
+import logging
+import time
+from aiogram.exceptions import TelegramRetryAfter, TelegramForbiddenError, TelegramBadRequest
+from config import config
+from bot.db import (
+    get_user,
+    mark_user_blocked,
+    iter_broadcast_recipients,
+    save_broadcast_progress,
+    get_unfinished_broadcasts
+)
+from bot.localization import get_message
+from bot.sender import BULK, priority
+from bot.tasks import in_background
+
+async def _deliver(bot, broadcast: dict, user_id: int) -> str:
+    """
+    Send the broadcast message to one user.
+
+    Args:
+        bot: Telegram Bot instance
+        broadcast: Broadcast document
+        user_id: Recipient user ID
+
+    Returns:
+        "sent", "blocked" or "failed"
+    """
+    # Pacing and flood control retries are handled by the sender
+    try:
+        if broadcast.get("text"):
+            await bot.send_message(user_id, broadcast["text"])
+        else:
+            await bot.copy_message(user_id, broadcast["from_chat_id"], broadcast["message_id"])
+        return "sent"
+    except TelegramForbiddenError:
+        await mark_user_blocked(user_id)
+        return "blocked"
+    except (TelegramBadRequest, TelegramRetryAfter) as e:
+        logging.info(f"Broadcast to {user_id} failed: {e}")
+        return "failed"
+    except Exception as e:
+        logging.error(f"Broadcast to {user_id} failed: {e}")
+        return "failed"
+
+async def run_broadcast(bot, broadcast: dict):
+    """
+    Send a broadcast to all users, resuming from its checkpoint.
+
+    Args:
+        bot: Telegram Bot instance
+        broadcast: Broadcast document
+    """
+    counts = {
+        "sent": broadcast["sent"],
+        "blocked": broadcast["blocked"],
+        "failed": broadcast["failed"]
+    }
+    last_user_id = broadcast["last_user_id"]
+    started = time.monotonic() - broadcast["elapsed"]
+
+    logging.info(f"Broadcast {broadcast['_id']} running from user {last_user_id}")
+
+    try:
+        async for user_ids in iter_broadcast_recipients(last_user_id, config.broadcast_batch_size):
+            with priority(BULK):
+                results = await asyncio.gather(*(_deliver(bot, broadcast, user_id) for user_id in user_ids))
+            for result in results:
+                counts[result] += 1
+
+            last_user_id = user_ids[-1]
+            await save_broadcast_progress(
+                broadcast["_id"],
+                last_user_id,
+                elapsed=time.monotonic() - started,
+                **counts
+            )
+    except Exception as e:
+        # The checkpoint stays unfinished and is resumed on the next start
+        logging.error(f"Broadcast {broadcast['_id']} interrupted: {e}")
+        return
+
+    elapsed = time.monotonic() - started
+    await save_broadcast_progress(broadcast["_id"], last_user_id, elapsed=elapsed, finished=True, **counts)
+
+    total = sum(counts.values())
+    logging.info(f"Broadcast {broadcast['_id']} finished: {counts} in {elapsed:.0f}s")
+
+    admin_data = await get_user(broadcast["admin_id"])
+    ui_lang = admin_data["ui_lang"] if admin_data and "ui_lang" in admin_data else "en"
+    await bot.send_message(
+        broadcast["admin_id"],
+        get_message(
+            ui_lang,
+            "broadcast_finished",
+            elapsed=int(elapsed),
+            rate=f"{total / elapsed:.1f}" if elapsed else "0",
+            **counts
+        )
+    )
+
+def start_broadcast(bot, broadcast: dict):
+    """
+    Run a broadcast in the background.
+
+    Args:
+        bot: Telegram Bot instance
+        broadcast: Broadcast document
+    """
+    in_background(run_broadcast(bot, broadcast))
+
+async def resume_broadcasts(bot):
+    """
+    Resume broadcasts interrupted by a restart.
+
+    Args:
+        bot: Telegram Bot instance
+    """
+    for broadcast in await get_unfinished_broadcasts():
+        start_broadcast(bot, broadcast)
@@ -1,30 +1,107 @@
 """
 Database module for the NinjaTranslate bot.
 """
+import asyncio
 import logging
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument
 from pymongo.errors import PyMongoError
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 from config import config
+from bot.hosting import current_bot, use_bot
+from bot.tracing import traced
 
-# Initialize MongoDB client
-client = AsyncIOMotorClient(config.mongo_uri)
+# Initialize MongoDB client; dates are stored and returned as UTC
+client = AsyncIOMotorClient(config.mongo_uri, tz_aware=True)
 db = client[config.mongo_db]
 
-# Collections
-users_collection = db.users
+def _collection(name: str):
+    """
+    Get a collection of the current bot.
+    
+    Bots with a namespace keep their data in collections prefixed with it.
+    
+    Args:
+        name: Collection name, e.g. "users"
+        
+    Returns:
+        Motor collection
+    """
+    namespace = current_bot().namespace
+    return db[f"{namespace}_{name}" if namespace else name]
+
+# Fields handlers actually read from a user document
+USER_FIELDS = {
+    "_id": 0,
+    "user_id": 1,
+    "ui_lang": 1,
+    "subscription_verified": 1,
+    "subscription_last_checked": 1,
+    "channels": 1
+}
+
+async def _ensure_retention_index(collection, field: str, days: int):
+    """
+    Create an index on a date field, expiring documents after the given number of days.
+    
+    An existing index on the field is recreated when its retention differs,
+    so changing the setting takes effect on the next start.
+    
+    Args:
+        collection: Motor collection
+        field: Date field name
+        days: Retention in days, 0 to keep documents forever
+    """
+    name = f"{field}_1"
+    expire_after = days * 24 * 60 * 60 if days > 0 else None
+    
+    existing = (await collection.index_information()).get(name)
+    if existing is not None and existing.get("expireAfterSeconds") != expire_after:
+        await collection.drop_index(name)
+    
+    if expire_after:
+        await collection.create_index(field, expireAfterSeconds=expire_after)
+    else:
+        await collection.create_index(field)
 
 async def init_db():
     """
-    Initialize database, create indexes if needed.
+    Initialize database, create indexes of every hosted bot if needed.
     """
     try:
-        # Create indexes
-        await users_collection.create_index("user_id", unique=True)
+        for bot_config in config.bots:
+            with use_bot(bot_config):
+                await _init_collections()
         logging.info("Database initialized successfully")
     except PyMongoError as e:
         logging.error(f"Database initialization error: {e}")
 
+async def _init_collections():
+    """
+    Create the indexes of the current bot's collections.
+    """
+    users_collection = _collection("users")
+    usage_collection = _collection("usage")
+    
+    # Create indexes
+    await users_collection.create_index("user_id", unique=True)
+    # Counted by /stats with covered index scans
+    await users_collection.create_index("ui_lang")
+    await users_collection.create_index("subscription_verified")
+    await usage_collection.create_index(
+        [("user_id", 1), ("source_lang", 1), ("target_lang", 1)],
+        unique=True
+    )
+    await usage_collection.create_index([("source_lang", 1), ("target_lang", 1)])
+    await _collection("broadcasts").create_index("finished")
+    await _collection("chats").create_index("chat_id", unique=True)
+    
+    # Data retention
+    await _ensure_retention_index(users_collection, "last_activity", config.user_retention_days)
+    await _ensure_retention_index(usage_collection, "last_used", config.user_retention_days)
+    await _ensure_retention_index(_collection("usage_log"), "created_at", config.usage_log_retention_days)
+
+@traced("db")
 async def save_user(user_id: int, username: str, first_name: str, last_name: str, ui_lang: str):
     """
     Save or update user in database.
@@ -43,13 +120,14 @@ async def save_user(user_id: int, username: str, first_name: str, last_name: str
             "first_name": first_name,
             "last_name": last_name,
             "ui_lang": ui_lang,
-            "last_activity": datetime.now(),
+            "last_activity": datetime.now(timezone.utc),
             "subscription_verified": False,
-            "subscription_last_checked": None
+            "subscription_last_checked": None,
+            "blocked": False
         }
         
         # Update user data if exists, or insert new document
-        await users_collection.update_one(
+        await _collection("users").update_one(
             {"user_id": user_id},
             {"$set": user_data},
             upsert=True
@@ -59,22 +137,25 @@ async def save_user(user_id: int, username: str, first_name: str, last_name: str
     except PyMongoError as e:
         logging.error(f"Error saving user to database: {e}")
 
-async def get_user(user_id: int):
+@traced("db")
+async def get_user(user_id: int, fields: dict = None):
     """
     Get user data from database.
     
     Args:
         user_id: Telegram user ID
+        fields: Projection of the fields to fetch, USER_FIELDS by default
         
     Returns:
         User data or None if not found
     """
     try:
-        return await users_collection.find_one({"user_id": user_id})
+        return await _collection("users").find_one({"user_id": user_id}, fields or USER_FIELDS)
     except PyMongoError as e:
         logging.error(f"Error fetching user from database: {e}")
         return None
 
+@traced("db")
 async def update_user_language(user_id: int, ui_lang: str):
     """
     Update user's interface language.
@@ -84,12 +165,12 @@ async def update_user_language(user_id: int, ui_lang: str):
         ui_lang: New interface language
     """
     try:
-        await users_collection.update_one(
+        await _collection("users").update_one(
             {"user_id": user_id},
             {
                 "$set": {
                     "ui_lang": ui_lang,
-                    "last_activity": datetime.now()
+                    "last_activity": datetime.now(timezone.utc)
                 }
             }
         )
@@ -97,53 +178,379 @@ async def update_user_language(user_id: int, ui_lang: str):
     except PyMongoError as e:
         logging.error(f"Error updating user language: {e}")
 
-async def update_subscription_status(user_id: int, verified: bool):
+@traced("db")
+async def touch_user(user_id: int):
+    """
+    Update user's last activity time.
+    
+    Args:
+        user_id: Telegram user ID
+    """
+    try:
+        await _collection("users").update_one(
+            {"user_id": user_id},
+            {"$set": {"last_activity": datetime.now(timezone.utc)}}
+        )
+    except PyMongoError as e:
+        logging.error(f"Error updating user activity: {e}")
+
+@traced("db")
+async def update_subscription_status(user_id: int, verified: bool, active: bool = True):
     """
     Update user's subscription verification status.
     
     Args:
         user_id: Telegram user ID
         verified: Whether user has verified subscriptions
+        active: Whether the update comes from the user's own activity
     """
     try:
-        await users_collection.update_one(
+        now = datetime.now(timezone.utc)
+        fields = {
+            "subscription_verified": verified,
+            "subscription_last_checked": now
+        }
+        if active:
+            fields["last_activity"] = now
+        
+        await _collection("users").update_one(
             {"user_id": user_id},
-            {
-                "$set": {
-                    "subscription_verified": verified,
-                    "subscription_last_checked": datetime.now(),
-                    "last_activity": datetime.now()
-                }
-            }
+            {"$set": fields}
         )
         logging.info(f"User subscription status updated: {user_id}, verified: {verified}")
     except PyMongoError as e:
         logging.error(f"Error updating subscription status: {e}")
 
-async def get_stats():
+@traced("db")
+async def update_channel_memberships(user_id: int, memberships: dict):
+    """
+    Store whether a user is a member of required channels.
+    
+    Args:
+        user_id: Telegram user ID
+        memberships: Dictionary of channel to membership
+        
+    Returns:
+        All stored channel memberships of the user, or None if the user is unknown
+    """
+    try:
+        user = await _collection("users").find_one_and_update(
+            {"user_id": user_id},
+            {"$set": {f"channels.{channel}": is_member for channel, is_member in memberships.items()}},
+            projection={"_id": 0, "channels": 1},
+            return_document=ReturnDocument.AFTER
+        )
+        return user.get("channels", {}) if user else None
+    except PyMongoError as e:
+        logging.error(f"Error updating channel memberships: {e}")
+        return None
+
+@traced("db")
+async def get_stats(ui_languages: tuple):
     """
     Get basic usage statistics.
     
+    All counts run concurrently and are answered from indexes.
+    
+    Args:
+        ui_languages: UI language codes to count users for
+        
     Returns:
         Dictionary with statistics
     """
     try:
-        total_users = await users_collection.count_documents({})
-        english_ui = await users_collection.count_documents({"ui_lang": "en"})
-        arabic_ui = await users_collection.count_documents({"ui_lang": "ar"})
-        subscribed_users = await users_collection.count_documents({"subscription_verified": True})
+        users_collection = _collection("users")
+        active_since = datetime.now(timezone.utc) - timedelta(days=7)
+        total_users, subscribed_users, active_users, *language_counts = await asyncio.gather(
+            users_collection.estimated_document_count(),
+            users_collection.count_documents({"subscription_verified": True}),
+            users_collection.count_documents({"last_activity": {"$gte": active_since}}),
+            *(users_collection.count_documents({"ui_lang": lang}) for lang in ui_languages)
+        )
         
         return {
             "total_users": total_users,
-            "english_ui": english_ui,
-            "arabic_ui": arabic_ui,
-            "subscribed_users": subscribed_users
+            "ui_languages": dict(zip(ui_languages, language_counts)),
+            "subscribed_users": subscribed_users,
+            "active_users": active_users
         }
     except PyMongoError as e:
         logging.error(f"Error getting statistics: {e}")
         return {
             "total_users": 0,
-            "english_ui": 0,
-            "arabic_ui": 0,
-            "subscribed_users": 0
-        } 
\ No newline at end of file
+            "ui_languages": {},
+            "subscribed_users": 0,
+            "active_users": 0
+        }
+
+@traced("db")
+async def record_usage(user_id: int, source_lang: str, target_lang: str, prompt_tokens: int, completion_tokens: int, latency_ms: int, memory_hit: bool = False):
+    """
+    Record token usage and latency of a translation request.
+    
+    Args:
+        user_id: Telegram user ID
+        source_lang: Source language code
+        target_lang: Target language code
+        prompt_tokens: Prompt tokens spent
+        completion_tokens: Completion tokens spent
+        latency_ms: Request latency in milliseconds
+        memory_hit: Whether the translation was served entirely from the translation memory
+    """
+    try:
+        now = datetime.now(timezone.utc)
+        
+        await _collection("usage_log").insert_one({
+            "user_id": user_id,
+            "source_lang": source_lang,
+            "target_lang": target_lang,
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "latency_ms": latency_ms,
+            "memory_hit": memory_hit,
+            "created_at": now
+        })
+        
+        await _collection("usage").update_one(
+            {"user_id": user_id, "source_lang": source_lang, "target_lang": target_lang},
+            {
+                "$inc": {
+                    "requests": 1,
+                    "memory_hits": 1 if memory_hit else 0,
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": completion_tokens,
+                    "latency_ms": latency_ms
+                },
+                "$set": {"last_used": now}
+            },
+            upsert=True
+        )
+    except PyMongoError as e:
+        logging.error(f"Error recording usage: {e}")
+
+@traced("db")
+async def get_usage_stats(top: int = 5):
+    """
+    Get aggregated token usage statistics.
+    
+    Args:
+        top: Number of language pairs to include
+        
+    Returns:
+        Dictionary with totals and the most expensive language pairs
+    """
+    totals = {
+        "requests": 0,
+        "memory_hits": 0,
+        "prompt_tokens": 0,
+        "completion_tokens": 0,
+        "latency_ms": 0
+    }
+    try:
+        fields = {field: {"$sum": f"${field}"} for field in totals}
+        
+        async for row in _collection("usage").aggregate([
+            {"$group": {"_id": None, **fields}}
+        ]):
+            totals.update({field: row[field] for field in totals})
+        
+        pairs = await _collection("usage").aggregate([
+            {"$group": {"_id": {"source_lang": "$source_lang", "target_lang": "$target_lang"}, **fields}},
+            {"$addFields": {"tokens": {"$add": ["$prompt_tokens", "$completion_tokens"]}}},
+            {"$sort": {"tokens": -1}},
+            {"$limit": top}
+        ]).to_list(length=top)
+        
+        return {**totals, "pairs": pairs}
+    except PyMongoError as e:
+        logging.error(f"Error getting usage statistics: {e}")
+        return {**totals, "pairs": []}
+
+@traced("db")
+async def get_top_language_pairs(limit: int):
+    """
+    Get the language pairs used by the most users.
+    
+    Args:
+        limit: Number of pairs to return
+        
+    Returns:
+        List of (source language code, target language code) tuples
+    """
+    try:
+        pairs = await _collection("usage").aggregate([
+            # Channel pre-translations are recorded under negative chat IDs
+            {"$match": {"user_id": {"$gt": 0}}},
+            {"$group": {"_id": {"source_lang": "$source_lang", "target_lang": "$target_lang"}, "users": {"$sum": 1}}},
+            {"$sort": {"users": -1}},
+            {"$limit": limit}
+        ]).to_list(length=limit)
+        return [(pair["_id"]["source_lang"], pair["_id"]["target_lang"]) for pair in pairs]
+    except PyMongoError as e:
+        logging.error(f"Error getting top language pairs: {e}")
+        return []
+
+@traced("db")
+async def get_chat_settings(chat_id: int):
+    """
+    Get auto-translation settings of a group chat.
+    
+    Args:
+        chat_id: Telegram chat ID
+        
+    Returns:
+        Settings document or None if the chat has none
+    """
+    try:
+        return await _collection("chats").find_one({"chat_id": chat_id}, {"_id": 0, "chat_id": 1, "target_langs": 1})
+    except PyMongoError as e:
+        logging.error(f"Error getting chat settings: {e}")
+        return None
+
+@traced("db")
+async def save_chat_settings(chat_id: int, target_langs: list, admin_id: int):
+    """
+    Save auto-translation settings of a group chat.
+    
+    Args:
+        chat_id: Telegram chat ID
+        target_langs: Target language codes, empty to turn auto-translation off
+        admin_id: ID of the admin who changed the settings
+        
+    Returns:
+        True if the settings were saved
+    """
+    try:
+        await _collection("chats").update_one(
+            {"chat_id": chat_id},
+            {"$set": {
+                "target_langs": target_langs,
+                "updated_by": admin_id,
+                "updated_at": datetime.now(timezone.utc)
+            }},
+            upsert=True
+        )
+        return True
+    except PyMongoError as e:
+        logging.error(f"Error saving chat settings: {e}")
+        return False
+
+@traced("db")
+async def mark_user_blocked(user_id: int):
+    """
+    Mark a user who blocked the bot so broadcasts skip them.
+    
+    Args:
+        user_id: Telegram user ID
+    """
+    try:
+        await _collection("users").update_one({"user_id": user_id}, {"$set": {"blocked": True}})
+    except PyMongoError as e:
+        logging.error(f"Error marking user as blocked: {e}")
+
+async def iter_broadcast_recipients(after_user_id: int, batch_size: int):
+    """
+    Stream IDs of users who have not blocked the bot in user ID order.
+    
+    Args:
+        after_user_id: Only users with a greater ID are returned
+        batch_size: Number of documents fetched from MongoDB per round trip
+        
+    Yields:
+        Lists of up to batch_size user IDs
+    """
+    cursor = _collection("users").find(
+        {"user_id": {"$gt": after_user_id}, "blocked": {"$ne": True}},
+        {"_id": 0, "user_id": 1}
+    ).sort("user_id", 1).batch_size(batch_size)
+    
+    batch = []
+    async for user in cursor:
+        batch.append(user["user_id"])
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    
+    if batch:
+        yield batch
+
+@traced("db")
+async def create_broadcast(admin_id: int, from_chat_id: int, message_id: int, text: str = None):
+    """
+    Create a broadcast checkpoint document.
+    
+    Args:
+        admin_id: Telegram user ID of the admin who started it
+        from_chat_id: Chat of the message to copy
+        message_id: ID of the message to copy
+        text: Text to send instead of copying a message
+        
+    Returns:
+        Broadcast document or None on error
+    """
+    broadcast = {
+        "admin_id": admin_id,
+        "from_chat_id": from_chat_id,
+        "message_id": message_id,
+        "text": text,
+        "last_user_id": 0,
+        "sent": 0,
+        "blocked": 0,
+        "failed": 0,
+        "elapsed": 0.0,
+        "finished": False,
+        "created_at": datetime.now(timezone.utc)
+    }
+    try:
+        result = await _collection("broadcasts").insert_one(broadcast)
+        broadcast["_id"] = result.inserted_id
+        return broadcast
+    except PyMongoError as e:
+        logging.error(f"Error creating broadcast: {e}")
+        return None
+
+@traced("db")
+async def save_broadcast_progress(broadcast_id, last_user_id: int, sent: int, blocked: int, failed: int, elapsed: float, finished: bool = False):
+    """
+    Checkpoint broadcast progress.
+    
+    Args:
+        broadcast_id: Broadcast document ID
+        last_user_id: Last user ID that has been processed
+        sent: Number of delivered messages
+        blocked: Number of users who blocked the bot
+        failed: Number of other failures
+        elapsed: Seconds spent sending so far
+        finished: Whether the broadcast is complete
+    """
+    try:
+        await _collection("broadcasts").update_one(
+            {"_id": broadcast_id},
+            {
+                "$set": {
+                    "last_user_id": last_user_id,
+                    "sent": sent,
+                    "blocked": blocked,
+                    "failed": failed,
+                    "elapsed": elapsed,
+                    "finished": finished,
+                    "updated_at": datetime.now(timezone.utc)
+                }
+            }
+        )
+    except PyMongoError as e:
+        logging.error(f"Error saving broadcast progress: {e}")
+
+@traced("db")
+async def get_unfinished_broadcasts():
+    """
+    Get broadcasts interrupted by a restart.
+    
+    Returns:
+        List of broadcast documents
+    """
+    try:
+        return await _collection("broadcasts").find({"finished": False}).to_list(length=None)
+    except PyMongoError as e:
+        logging.error(f"Error fetching unfinished broadcasts: {e}")
+        return []
@@ -0,0 +1,71 @@
+"""
+Cheap local language detection for the NinjaTranslate bot.
+
+Detection is a heuristic over writing systems, a few distinctive letters
+and common short words. It only has to be good enough to skip texts that
+are already in the target language, so it returns None when unsure.
+"""
+import re
+
+# Writing systems used by a single supported language
+_SCRIPTS = (
+    ("ar", re.compile(r"[\u0600-\u06FF]")),
+    ("hi", re.compile(r"[\u0900-\u097F]")),
+    ("ko", re.compile(r"[\uAC00-\uD7AF]")),
+    ("ja", re.compile(r"[\u3040-\u30FF]")),
+    ("zh", re.compile(r"[\u4E00-\u9FFF]"))
+)
+
+_CYRILLIC = re.compile(r"[\u0400-\u04FF]")
+_UKRAINIAN_LETTERS = re.compile(r"[іїєґІЇЄҐ]")
+_RUSSIAN_LETTERS = re.compile(r"[ыэъёЫЭЪЁ]")
+
+_WORD = re.compile(r"[^\W\d_]+")
+
+# Frequent short words of Latin-script languages
+_STOPWORDS = {
+    "en": {"the", "and", "is", "are", "you", "to", "of", "in", "it", "that", "this", "for", "with", "was", "have", "what"},
+    "es": {"el", "la", "los", "las", "y", "es", "que", "de", "en", "un", "una", "por", "para", "con", "no", "muy"},
+    "fr": {"le", "la", "les", "et", "est", "que", "de", "des", "un", "une", "pour", "avec", "pas", "je", "vous", "nous"},
+    "de": {"der", "die", "das", "und", "ist", "nicht", "ich", "du", "ein", "eine", "zu", "mit", "auf", "sie", "wir", "auch"},
+    "pt": {"o", "os", "as", "e", "que", "de", "do", "da", "em", "um", "uma", "para", "com", "não", "você", "muito"},
+    "it": {"il", "lo", "gli", "e", "che", "di", "non", "un", "una", "per", "con", "sono", "io", "è", "anche", "molto"},
+    "nl": {"de", "het", "een", "en", "is", "dat", "niet", "ik", "je", "van", "met", "voor", "op", "zijn", "maar", "ook"},
+    "sv": {"och", "att", "det", "är", "en", "ett", "som", "på", "inte", "jag", "du", "med", "för", "har", "men", "om"},
+    "pl": {"i", "w", "nie", "to", "jest", "się", "na", "że", "z", "do", "jak", "ale", "co", "tak", "czy", "jestem"},
+    "tr": {"ve", "bir", "bu", "da", "de", "için", "ne", "ben", "sen", "çok", "mi", "var", "yok", "ile", "gibi", "ama"},
+    "vi": {"và", "là", "của", "có", "không", "tôi", "bạn", "được", "những", "một", "này", "cho", "với", "các", "người", "đã"}
+}
+
+def detect_language(text: str):
+    """
+    Guess the language of a text.
+
+    Args:
+        text: Text to check
+
+    Returns:
+        Language code, or None if the language is unclear
+    """
+    for code, script in _SCRIPTS:
+        if script.search(text):
+            return code
+
+    if _CYRILLIC.search(text):
+        if _UKRAINIAN_LETTERS.search(text):
+            return "uk"
+        if _RUSSIAN_LETTERS.search(text):
+            return "ru"
+        return None
+
+    words = [word.lower() for word in _WORD.findall(text)]
+    if not words:
+        return None
+
+    scores = {code: sum(word in stopwords for word in words) for code, stopwords in _STOPWORDS.items()}
+    best = max(scores, key=scores.get)
+    ranked = sorted(scores.values(), reverse=True)
+    # Require a clear winner, short texts often share words between languages
+    if ranked[0] == 0 or ranked[0] == ranked[1]:
+        return None
+    return best
@@ -0,0 +1,262 @@
+"""
+Document translation for the NinjaTranslate bot.
+
+Files are parsed lazily into pieces, grouped into batches and translated
+concurrently within a bounded window, so the translated file can be
+written out while the rest of the source is still being read. Pieces
+longer than a batch are split by line, then by sentence, then by word.
+"""
+import asyncio
+import re
+from collections import deque
+from config import config
+from bot.translations import translate_segments
+
+def _parse_blocks(lines, fences: bool):
+    """
+    Yield paragraph pieces of a plain text or Markdown file.
+
+    Args:
+        lines: Iterable of source lines
+        fences: Whether to keep fenced code blocks untranslated
+
+    Yields:
+        Tuples of (text, translatable)
+    """
+    block = []
+    fence = None
+
+    for line in lines:
+        stripped = line.strip()
+
+        if fence:
+            yield line, False
+            if stripped.startswith(fence):
+                fence = None
+            continue
+
+        if stripped and not (fences and stripped.startswith(("```", "~~~"))):
+            block.append(line.rstrip("\r\n"))
+            continue
+
+        if block:
+            yield "\n".join(block), True
+            yield "\n", False
+            block = []
+
+        if stripped:
+            fence = stripped[:3]
+        yield line, False
+
+    if block:
+        yield "\n".join(block), True
+        yield "\n", False
+
+def parse_text(lines):
+    """
+    Yield pieces of a plain text file, one translatable piece per paragraph.
+    """
+    return _parse_blocks(lines, fences=False)
+
+def parse_markdown(lines):
+    """
+    Yield pieces of a Markdown file, keeping fenced code blocks untranslated.
+    """
+    return _parse_blocks(lines, fences=True)
+
+def parse_srt(lines):
+    """
+    Yield pieces of an SRT file, one translatable piece per cue text.
+
+    Args:
+        lines: Iterable of source lines
+
+    Yields:
+        Tuples of (text, translatable)
+    """
+    body = []
+    in_cue = False
+
+    for line in lines:
+        if not line.strip():
+            if body:
+                yield "\n".join(body), True
+                yield "\n", False
+                body = []
+            in_cue = False
+            yield line, False
+        elif not in_cue:
+            # Cue number and timing lines are copied as-is
+            if "-->" in line:
+                in_cue = True
+            yield line, False
+        else:
+            body.append(line.rstrip("\r\n"))
+
+    if body:
+        yield "\n".join(body), True
+        yield "\n", False
+
+# Supported document types by file extension
+PARSERS = {
+    ".txt": parse_text,
+    ".md": parse_markdown,
+    ".srt": parse_srt
+}
+
+# Separators oversized pieces are split at, coarsest first
+_SPLITTERS = (
+    re.compile(r"(\n+)"),
+    re.compile(r"(?<=[.!?…。！？])(\s+)"),
+    re.compile(r"(\s+)")
+)
+
+def _split_oversized(text: str, max_chars: int, level: int = 0):
+    """
+    Split a translatable piece into parts of up to max_chars.
+
+    Neighbouring parts are packed together up to max_chars, and the
+    separators between them are kept as untranslatable pieces, so joining
+    the output restores the layout. A single word longer than max_chars
+    is left whole.
+
+    Args:
+        text: Translatable text
+        max_chars: Maximum characters per part
+        level: Index of the splitter to use
+
+    Yields:
+        Tuples of (text, translatable)
+    """
+    if len(text) <= max_chars or level == len(_SPLITTERS):
+        if text:
+            yield text, True
+        return
+
+    # Split with a capturing group alternates parts and separators
+    parts = _SPLITTERS[level].split(text)
+    chunk = None
+    gap = ""
+
+    for index in range(0, len(parts), 2):
+        part = parts[index]
+        if chunk is not None and len(chunk) + len(gap) + len(part) <= max_chars:
+            chunk += gap + part
+        else:
+            if chunk is not None:
+                yield from _split_oversized(chunk, max_chars, level + 1)
+                yield gap, False
+            chunk = part
+        gap = parts[index + 1] if index + 1 < len(parts) else ""
+
+    yield from _split_oversized(chunk, max_chars, level + 1)
+
+def _split_pieces(pieces, max_chars: int):
+    """
+    Split translatable pieces that would not fit into a batch.
+
+    Args:
+        pieces: Iterable of (text, translatable) tuples
+        max_chars: Maximum translatable characters per batch
+
+    Yields:
+        Tuples of (text, translatable)
+    """
+    for text, translatable in pieces:
+        if translatable and len(text) > max_chars:
+            yield from _split_oversized(text, max_chars)
+        else:
+            yield text, translatable
+
+def _batches(pieces, max_chars: int):
+    """
+    Group pieces into batches with up to max_chars of translatable text.
+
+    Args:
+        pieces: Iterable of (text, translatable) tuples
+        max_chars: Maximum translatable characters per batch
+
+    Yields:
+        Lists of (text, translatable) tuples
+    """
+    batch = []
+    size = 0
+
+    for text, translatable in _split_pieces(pieces, max_chars):
+        if translatable and batch and size + len(text) > max_chars:
+            yield batch
+            batch = []
+            size = 0
+        batch.append((text, translatable))
+        if translatable:
+            size += len(text)
+
+    if batch:
+        yield batch
+
+async def _translate_batch(batch: list, source_lang: str, target_lang: str, user_id: int) -> str:
+    """
+    Translate the translatable pieces of a batch and reassemble it.
+
+    Args:
+        batch: List of (text, translatable) tuples
+        source_lang: Source language
+        target_lang: Target language
+        user_id: Telegram user ID for usage accounting
+
+    Returns:
+        Translated batch text
+    """
+    segments = [text for text, translatable in batch if translatable]
+    translations = iter(await translate_segments(segments, source_lang, target_lang, user_id) if segments else [])
+
+    return "".join(next(translations) if translatable else text for text, translatable in batch)
+
+async def _translate_batches(batches, source_lang: str, target_lang: str, user_id: int):
+    """
+    Translate batches concurrently within a bounded window, in order.
+
+    Args:
+        batches: Iterable of batches
+        source_lang: Source language
+        target_lang: Target language
+        user_id: Telegram user ID for usage accounting
+
+    Yields:
+        Translated batch texts in source order
+    """
+    pending = deque()
+    try:
+        for batch in batches:
+            pending.append(asyncio.create_task(_translate_batch(batch, source_lang, target_lang, user_id)))
+            if len(pending) >= config.document_concurrency:
+                yield await pending.popleft()
+
+        while pending:
+            yield await pending.popleft()
+    finally:
+        for task in pending:
+            task.cancel()
+
+async def translate_document(source_path: str, target_path: str, extension: str, source_lang: str, target_lang: str, user_id: int = None):
+    """
+    Translate a document file into another file.
+
+    Args:
+        source_path: Path of the downloaded source file
+        target_path: Path to write the translated file to
+        extension: Lowercase file extension selecting the parser
+        source_lang: Source language
+        target_lang: Target language
+        user_id: Telegram user ID for usage accounting
+
+    Raises:
+        Exception: If translation fails
+    """
+    parser = PARSERS[extension]
+
+    with open(source_path, encoding="utf-8-sig", errors="replace", newline="") as source, \
+            open(target_path, "w", encoding="utf-8", newline="") as target:
+        batches = _batches(parser(source), config.document_batch_chars)
+        async for chunk in _translate_batches(batches, source_lang, target_lang, user_id):
+            target.write(chunk)
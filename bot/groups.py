@@ -0,0 +1,286 @@
+"""
+Group chat auto-translation for the NinjaTranslate bot.
+
+Admins choose target languages per group with /autotranslate. Group
+messages are collected into short bursts and each burst is translated
+with one request per target language in the background. Messages that
+already are in a target language are skipped for it. The bot needs
+privacy mode disabled in @BotFather to see group messages.
+"""
+import asyncio
+import logging
+import time
+from aiogram import Router, F
+from aiogram.exceptions import TelegramAPIError
+from aiogram.filters import Command, CommandObject
+from aiogram.types import Message
+from config import config
+from bot.admission import Overloaded, background
+from bot.db import get_chat_settings, save_chat_settings
+from bot.detection import detect_language
+from bot.hosting import scoped
+from bot.localization import get_message, localize_language_names, UI_LANGUAGES
+from bot.memory import split_segments, join_segments
+from bot.tasks import in_background
+from bot.translations import LANGUAGES, AUTO_DETECT, translate_segments
+
+# Longest reply Telegram accepts
+MAX_MESSAGE_LENGTH = 4096
+
+group_router = Router()
+group_router.message.filter(F.chat.type.in_({"group", "supergroup"}))
+
+# Cached target languages by (bot namespace, chat ID): (language codes, expiry time)
+_settings = {}
+
+# Messages waiting to be translated and the timers flushing them, by (bot namespace, chat ID)
+_pending = {}
+_flush_timers = {}
+
+def _ui_lang(message: Message) -> str:
+    """
+    Choose the UI language for a reply in a group.
+
+    Args:
+        message: Telegram message object
+
+    Returns:
+        UI language code from the sender's Telegram settings, English by default
+    """
+    language_code = message.from_user.language_code if message.from_user else None
+    return language_code if language_code in UI_LANGUAGES else "en"
+
+async def get_target_languages(chat_id: int) -> list:
+    """
+    Get the auto-translation target languages of a group, cached.
+
+    Args:
+        chat_id: Telegram chat ID
+
+    Returns:
+        List of language codes, empty if auto-translation is off
+    """
+    cached = _settings.get(scoped(chat_id))
+    if cached is not None and cached[1] > time.monotonic():
+        return cached[0]
+
+    settings = await get_chat_settings(chat_id)
+    target_langs = settings.get("target_langs", []) if settings else []
+    _settings[scoped(chat_id)] = (target_langs, time.monotonic() + config.group_settings_ttl)
+    return target_langs
+
+async def _is_group_admin(message: Message) -> bool:
+    """
+    Check if a group message was sent by an admin of the group.
+
+    Anonymous admins post on behalf of the group itself.
+
+    Args:
+        message: Telegram message object
+
+    Returns:
+        True if the sender is an admin
+
+    Raises:
+        TelegramAPIError: If the sender's status cannot be checked
+    """
+    if message.sender_chat and message.sender_chat.id == message.chat.id:
+        return True
+    member = await message.bot.get_chat_member(message.chat.id, message.from_user.id)
+    return member.status in ("administrator", "creator")
+
+@group_router.message(Command("autotranslate"))
+async def cmd_autotranslate(message: Message, command: CommandObject):
+    """
+    Handle the /autotranslate command (group admins only).
+
+    /autotranslate en uk turns auto-translation into English and Ukrainian
+    on, /autotranslate off turns it off.
+
+    Args:
+        message: Telegram message object
+        command: Parsed command with its arguments
+    """
+    ui_lang = _ui_lang(message)
+
+    try:
+        is_admin = await _is_group_admin(message)
+    except TelegramAPIError as e:
+        logging.error(f"Error checking group admin: {e}")
+        await message.answer(get_message(ui_lang, "error"))
+        return
+
+    if not is_admin:
+        await message.answer(get_message(ui_lang, "group_admin_only"))
+        return
+
+    args = (command.args or "").lower().replace(",", " ").split()
+    target_langs = [] if args == ["off"] else list(dict.fromkeys(args))
+    if args != ["off"] and (
+        not target_langs
+        or len(target_langs) > config.max_target_languages
+        or any(code not in LANGUAGES for code in target_langs)
+    ):
+        await message.answer(get_message(
+            ui_lang,
+            "group_usage",
+            codes=", ".join(LANGUAGES),
+            max_targets=config.max_target_languages
+        ))
+        return
+
+    if not await save_chat_settings(message.chat.id, target_langs, message.from_user.id):
+        await message.answer(get_message(ui_lang, "error"))
+        return
+
+    _settings[scoped(message.chat.id)] = (target_langs, time.monotonic() + config.group_settings_ttl)
+
+    if not target_langs:
+        await message.answer(get_message(ui_lang, "group_disabled"))
+        return
+
+    names = [localize_language_names(ui_lang, LANGUAGES[code])[0] for code in target_langs]
+    await message.answer(get_message(ui_lang, "group_enabled", languages=", ".join(names)))
+
+@group_router.message(F.text & ~F.text.startswith("/"))
+async def collect_group_message(message: Message):
+    """
+    Queue a group message for auto-translation.
+
+    Messages of groups without auto-translation are ignored.
+
+    Args:
+        message: Telegram message object
+    """
+    chat_id = message.chat.id
+    if not await get_target_languages(chat_id):
+        return
+
+    if len(message.text) > config.max_text_length:
+        return
+
+    batch = _pending.setdefault(scoped(chat_id), [])
+    batch.append(message)
+
+    if len(batch) >= config.group_batch_size:
+        _flush(chat_id)
+    elif scoped(chat_id) not in _flush_timers:
+        _flush_timers[scoped(chat_id)] = in_background(_flush_later(chat_id))
+
+async def _flush_later(chat_id: int):
+    """
+    Translate a chat's queued messages once the burst window has passed.
+
+    Args:
+        chat_id: Telegram chat ID
+    """
+    await asyncio.sleep(config.group_batch_delay)
+    _flush(chat_id)
+
+def _flush(chat_id: int):
+    """
+    Start translating a chat's queued messages.
+
+    Args:
+        chat_id: Telegram chat ID
+    """
+    timer = _flush_timers.pop(scoped(chat_id), None)
+    if timer is not None and timer is not asyncio.current_task():
+        timer.cancel()
+
+    messages = _pending.pop(scoped(chat_id), [])
+    if messages:
+        in_background(_translate_batch(chat_id, messages))
+
+async def _translate_to(chat_id: int, messages: list, languages: list, target_lang_code: str) -> dict:
+    """
+    Translate the messages of a batch that are not in the target language yet.
+
+    Args:
+        chat_id: Telegram chat ID, token usage is recorded under it
+        messages: Queued messages
+        languages: Detected language code of each message, or None
+        target_lang_code: Target language code
+
+    Returns:
+        Dictionary of message index to translated text
+    """
+    indices = [index for index, language in enumerate(languages) if language != target_lang_code]
+    if not indices:
+        return {}
+
+    # All messages go into one request, one or more segments per message
+    splits = [split_segments(messages[index].text) for index in indices]
+    segments = [segment for message_segments, _ in splits for segment in message_segments]
+    translations = iter(await translate_segments(segments, AUTO_DETECT, LANGUAGES[target_lang_code], user_id=chat_id))
+
+    return {
+        index: join_segments([next(translations) for _ in message_segments], separators)
+        for index, (message_segments, separators) in zip(indices, splits)
+    }
+
+async def _translate_batch(chat_id: int, messages: list):
+    """
+    Translate a burst of group messages and post the translations.
+
+    Args:
+        chat_id: Telegram chat ID
+        messages: Queued messages in arrival order
+    """
+    target_langs = await get_target_languages(chat_id)
+    if not target_langs:
+        return
+
+    languages = [detect_language(message.text) for message in messages]
+    # Group traffic yields to private chats under load
+    with background():
+        results = await asyncio.gather(
+            *(_translate_to(chat_id, messages, languages, code) for code in target_langs),
+            return_exceptions=True
+        )
+
+    entries = []
+    for index, message in enumerate(messages):
+        lines = []
+        for code, result in zip(target_langs, results):
+            if isinstance(result, Overloaded):
+                logging.info(f"Group translation into {code} shed: {result}")
+            elif isinstance(result, Exception):
+                logging.error(f"Group translation error ({code}): {result}")
+            elif index in result and result[index].strip() != message.text.strip():
+                lines.append(f"{LANGUAGES[code].split(' ')[0]} {result[index]}")
+        if lines:
+            entries.append((message, "\n".join(lines)))
+
+    if len(entries) == 1:
+        message, text = entries[0]
+        await _send(message, text[:MAX_MESSAGE_LENGTH], reply=True)
+        return
+
+    # Several translated messages are posted together, each under its author's name
+    chunk = ""
+    for message, text in entries:
+        entry = f"{message.from_user.full_name if message.from_user else ''}:\n{text}"[:MAX_MESSAGE_LENGTH]
+        if chunk and len(chunk) + len(entry) + 2 > MAX_MESSAGE_LENGTH:
+            await _send(message, chunk)
+            chunk = ""
+        chunk = f"{chunk}\n\n{entry}" if chunk else entry
+    if chunk:
+        await _send(entries[-1][0], chunk)
+
+async def _send(message: Message, text: str, reply: bool = False):
+    """
+    Post translations to a group.
+
+    Args:
+        message: Message the translations belong to
+        text: Text to post
+        reply: Whether to reply to the message
+    """
+    try:
+        if reply:
+            await message.reply(text)
+        else:
+            await message.answer(text)
+    except Exception as e:
+        logging.error(f"Error sending group translation: {e}")
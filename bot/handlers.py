@@ -1,149 +1,81 @@
 """
 Handlers module for the NinjaTranslate bot.
 """
+import asyncio
+import hashlib
 import logging
+import time
 from aiogram import Router, F
-from aiogram.types import Message, CallbackQuery
-from aiogram.filters import CommandStart, Command
+from aiogram.types import (
+    Message,
+    CallbackQuery,
+    ChatMemberUpdated,
+    BufferedInputFile,
+    FSInputFile,
+    InlineQuery,
+    InlineQueryResultArticle,
+    InlineQueryResultsButton,
+    InputTextMessageContent
+)
+from aiogram.filters import CommandStart, Command, CommandObject
+from aiogram.exceptions import TelegramBadRequest
 import os
-from datetime import datetime, timedelta
+import tempfile
 from bot.keyboards import (
     get_language_keyboard, 
     get_ui_language_keyboard, 
     get_target_language_keyboard,
+    get_multi_target_language_keyboard,
     get_subscription_keyboard
 )
-from bot.localization import get_message, localize_language_names
-from bot.translations import LANGUAGES, translate_text
+from bot.localization import get_message, get_language_name, localize_language_names, LANGUAGE_FLAGS, UI_LANGUAGES
+from bot.translations import LANGUAGES, translate_text, translate_segments, retranslate_segments, lookup_translation
+from bot.memory import split_segments, join_segments
+from bot.documents import PARSERS, translate_document
+from bot.admission import Overloaded, background
+from bot.pretranslate import schedule_pretranslation
+from bot import profiler
 from bot.db import (
     save_user, 
-    get_user, 
     update_user_language, 
     update_subscription_status,
-    get_stats
+    update_channel_memberships,
+    get_stats,
+    get_usage_stats,
+    create_broadcast
+)
+from bot.broadcast import start_broadcast
+from bot.hosting import scoped
+from bot.middlewares import UserContext, setup_middlewares, send_subscription_required
+from bot.state import user_states, remember_reply, get_reply_record
+from bot.subscription import (
+    get_channel_links,
+    get_channel_memberships,
+    remember_verdict,
+    required_channel,
+    is_required_channel,
+    is_member,
+    verdict_from_memberships
 )
 from config import config
 
-# Initialize router
+# Initialize router, group chats are served by the group router only
 router = Router()
+router.message.filter(F.chat.type == "private")
+router.edited_message.filter(F.chat.type == "private")
+setup_middlewares(router)
 
-# User states dictionary (for translation direction)
-user_states = {}
-
-# Admin user IDs
-ADMIN_IDS = os.getenv("ADMIN_IDS", "").split(",")  # Replace with your actual admin ID(s)
-
-async def check_user_subscription(bot, user_id: int):
-    """
-    Check if user is subscribed to all required channels.
-    
-    Args:
-        bot: Telegram Bot instance
-        user_id: Telegram user ID
-        
-    Returns:
-        True if subscribed to all required channels, False otherwise
-    """
-    if not config.validate_channels():
-        # If no channels are configured, assume subscription is verified
-        return True
-    
-    for channel in config.required_channels:
-        try:
-            chat_member = await bot.get_chat_member(channel, user_id)
-            status = chat_member.status
-            if status not in ['member', 'administrator', 'creator']:
-                return False
-        except Exception as e:
-            logging.error(f"Error checking subscription status: {e}")
-            return False
-    
-    return True
+# In-flight inline translations by (bot namespace, user ID)
+inline_tasks = {}
 
-async def check_subscription_middleware(handler, message, data):
-    """
-    Middleware to check user subscription before handling messages.
-    
-    Args:
-        handler: Next handler in the chain
-        message: Telegram message object
-        data: Additional data
-        
-    Returns:
-        Result of the next handler or None if subscription check fails
-    """
-    user_id = message.from_user.id
-    bot = data["bot"]
-    
-    # Skip check for admin users
-    if str(user_id) in ADMIN_IDS:
-        return await handler(message, data)
-    
-    # Get user from database
-    user_data = await get_user(user_id)
-    ui_lang = user_data["ui_lang"] if user_data and "ui_lang" in user_data else "en"
-    
-    # Check if user has verified subscription or if we need to recheck
-    if user_data and "subscription_verified" in user_data and user_data["subscription_verified"]:
-        # Check if we need to reverify subscription (every X minutes)
-        last_checked = user_data.get("subscription_last_checked")
-        
-        if last_checked and datetime.now() - last_checked < timedelta(minutes=config.subscription_check_interval):
-            return await handler(message, data)
-    
-    # Check if user is subscribed to required channels
-    is_subscribed = await check_user_subscription(bot, user_id)
-    
-    if is_subscribed:
-        # Update user's subscription status
-        await update_subscription_status(user_id, True)
-        return await handler(message, data)
-    else:
-        # Update user's subscription status
-        await update_subscription_status(user_id, False)
-        
-        # Create channel links list
-        channel_links = ""
-        for channel in config.required_channels:
-            # Extract channel username/ID for display
-            if channel.startswith('@'):
-                channel_name = channel
-                channel_link = f"https://t.me/{channel[1:]}"
-            else:
-                try:
-                    chat = await bot.get_chat(channel)
-                    channel_name = chat.title or channel
-                    if chat.username:
-                        channel_link = f"https://t.me/{chat.username}"
-                    else:
-                        channel_link = f"Channel ID: {channel}"
-                except Exception as e:
-                    logging.error(f"Error getting channel info: {e}")
-                    channel_name = channel
-                    channel_link = f"Channel ID: {channel}"
-            
-            channel_links += f"• <a href='{channel_link}'>{channel_name}</a>\n"
-        
-        # Send subscription required message
-        await message.answer(
-            get_message(ui_lang, "subscription_required", channel_links=channel_links) + 
-            "\n\n🎁 This bot is completely free! You just need to subscribe to use it.\n\n" +
-            "📱 Also check out my other useful bots:\n" +
-            "🎬 @Vidzillabot - Video downloader\n" +
-            "🔊 @voiceletbot - Speech to text",
-            reply_markup=get_subscription_keyboard(ui_lang),
-            parse_mode="HTML",
-            disable_web_page_preview=True
-        )
-        return None
-
-@router.message(CommandStart())
-async def cmd_start(message: Message):
+@router.message(CommandStart(), flags={"skip_subscription": True})
+async def cmd_start(message: Message, ctx: UserContext):
     """
     Handle the /start command.
     
     Args:
         message: Telegram message object
+        ctx: User context
     """
     # Get user data
     user_id = message.from_user.id
@@ -151,108 +83,203 @@ async def cmd_start(message: Message):
     first_name = message.from_user.first_name or ""
     last_name = message.from_user.last_name or ""
     
-    # Default to English for new users
-    ui_lang = "en"
+    # Save user to database, new users default to English
+    await save_user(user_id, username, first_name, last_name, ctx.ui_lang)
     
-    # Save user to database
-    await save_user(user_id, username, first_name, last_name, ui_lang)
+    # Check subscription after the user is saved
+    if not ctx.subscribed:
+        await send_subscription_required(message, ctx)
+        return
     
-    # Check subscription
-    result = await check_subscription_middleware(
-        lambda msg, _: msg.answer(
-            get_message(ui_lang, "welcome") + 
-            "\n\n🎁 This bot is completely free! You only need to subscribe to two channels to use it.\n\n" +
-            "Check out my other useful bots:\n" +
-            "🎬 @Vidzillabot - Video downloader\n" +
-            "🔊 @voiceletbot - Speech to text",
-            reply_markup=get_language_keyboard()
-        ),
-        message,
-        {"bot": message.bot}
+    await message.answer(
+        get_message(ctx.ui_lang, "start"),
+        reply_markup=get_language_keyboard()
     )
 
 @router.message(Command("language", "lang"))
-async def cmd_language(message: Message):
+async def cmd_language(message: Message, ctx: UserContext):
     """
     Handle the /language command.
     
     Args:
         message: Telegram message object
+        ctx: User context
     """
-    user_id = message.from_user.id
-    
-    # Get user from database
-    user_data = await get_user(user_id)
-    ui_lang = user_data["ui_lang"] if user_data and "ui_lang" in user_data else "en"
-    
-    # Check subscription
-    await check_subscription_middleware(
-        lambda msg, _: msg.answer(
-            get_message(ui_lang, "language_cmd"),
-            reply_markup=get_ui_language_keyboard(ui_lang)
-        ),
-        message,
-        {"bot": message.bot}
+    await message.answer(
+        get_message(ctx.ui_lang, "language_cmd"),
+        reply_markup=get_ui_language_keyboard(ctx.ui_lang)
     )
 
 @router.message(Command("translate", "tr"))
-async def cmd_translate(message: Message):
+async def cmd_translate(message: Message, ctx: UserContext):
     """
     Handle the /translate command to start translation flow.
     
     Args:
         message: Telegram message object
+        ctx: User context
     """
-    user_id = message.from_user.id
-    
-    # Get user preferred language
-    user_data = await get_user(user_id)
-    ui_lang = user_data["ui_lang"] if user_data and "ui_lang" in user_data else "en"
-    
-    # Check subscription
-    await check_subscription_middleware(
-        lambda msg, _: msg.answer(
-            get_message(ui_lang, "select_source"),
-            reply_markup=get_language_keyboard()
-        ),
-        message,
-        {"bot": message.bot}
+    await message.answer(
+        get_message(ctx.ui_lang, "select_source"),
+        reply_markup=get_language_keyboard()
     )
 
 @router.message(Command("stats"))
-async def cmd_stats(message: Message):
+async def cmd_stats(message: Message, ctx: UserContext):
     """
     Handle the /stats command (admin only).
     
     Args:
         message: Telegram message object
+        ctx: User context
     """
-    user_id = message.from_user.id
-    
     # Check if user is admin
-    if str(user_id) not in ADMIN_IDS:
+    if not ctx.is_admin:
         return
     
-    # Get user preferred language
-    user_data = await get_user(user_id)
-    ui_lang = user_data["ui_lang"] if user_data and "ui_lang" in user_data else "en"
+    ui_lang = ctx.ui_lang
     
     # Get statistics
-    stats = await get_stats()
+    stats = await get_stats(UI_LANGUAGES)
+    
+    # Users per interface language
+    ui_languages = "\n".join(
+        f"{LANGUAGE_FLAGS.get(lang_code, '🏳️')} {get_language_name(ui_lang, lang_code)}: {count}"
+        for lang_code, count in stats["ui_languages"].items()
+    )
     
     # Format stats message
     stats_message = get_message(
         ui_lang, 
         "stats", 
         total_users=stats["total_users"], 
-        english_ui=stats["english_ui"], 
-        arabic_ui=stats["arabic_ui"],
-        subscribed_users=stats["subscribed_users"]
+        ui_languages=ui_languages,
+        subscribed_users=stats["subscribed_users"],
+        active_users=stats["active_users"]
     )
     
     await message.answer(stats_message)
+
+@router.message(Command("usage"))
+async def cmd_usage(message: Message, ctx: UserContext):
+    """
+    Handle the /usage command (admin only).
+    
+    Args:
+        message: Telegram message object
+        ctx: User context
+    """
+    # Check if user is admin
+    if not ctx.is_admin:
+        return
+    
+    ui_lang = ctx.ui_lang
+    
+    # Get usage statistics
+    usage = await get_usage_stats()
+    api_requests = usage["requests"] - usage["memory_hits"]
+    
+    top_pairs = ""
+    for pair in usage["pairs"]:
+        source_lang = pair["_id"]["source_lang"]
+        target_lang = pair["_id"]["target_lang"]
+        top_pairs += f"• {source_lang} → {target_lang}: {pair['tokens']} ({pair['requests']})\n"
+    
+    # Format usage message
+    usage_message = get_message(
+        ui_lang,
+        "usage",
+        requests=usage["requests"],
+        memory_hits=usage["memory_hits"],
+        prompt_tokens=usage["prompt_tokens"],
+        completion_tokens=usage["completion_tokens"],
+        avg_latency=usage["latency_ms"] // api_requests if api_requests else 0,
+        top_pairs=top_pairs or "—"
+    )
+    
+    await message.answer(usage_message)
+    
+@router.message(Command("broadcast"))
+async def cmd_broadcast(message: Message, command: CommandObject, ctx: UserContext):
+    """
+    Handle the /broadcast command (admin only).
+    
+    Replying to a message with /broadcast copies that message to all users,
+    /broadcast <text> sends the text.
+    
+    Args:
+        message: Telegram message object
+        command: Parsed command with its arguments
+        ctx: User context
+    """
+    # Check if user is admin
+    if not ctx.is_admin:
+        return
+    
+    ui_lang = ctx.ui_lang
+    
+    source_message = message.reply_to_message
+    if not source_message and not command.args:
+        await message.answer(get_message(ui_lang, "broadcast_usage"))
+        return
+    
+    broadcast = await create_broadcast(
+        ctx.user_id,
+        message.chat.id,
+        source_message.message_id if source_message else message.message_id,
+        None if source_message else command.args
+    )
+    if broadcast is None:
+        await message.answer(get_message(ui_lang, "error"))
+        return
+    
+    start_broadcast(message.bot, broadcast)
+    await message.answer(get_message(ui_lang, "broadcast_started"))
+
+@router.message(Command("profile"))
+async def cmd_profile(message: Message, command: CommandObject, ctx: UserContext):
+    """
+    Handle the /profile command (admin only).
+    
+    Samples the event loop for a number of seconds and replies with
+    folded stacks ready for a flame graph.
+    
+    Args:
+        message: Telegram message object
+        command: Parsed command with its arguments
+        ctx: User context
+    """
+    # Check if user is admin
+    if not ctx.is_admin:
+        return
+    
+    ui_lang = ctx.ui_lang
+    
+    duration = config.profile_duration
+    if command.args:
+        if not command.args.strip().isdigit() or not 0 < int(command.args) <= config.profile_max_duration:
+            await message.answer(get_message(ui_lang, "profile_usage", max_duration=config.profile_max_duration))
+            return
+        duration = int(command.args)
+    
+    if profiler.is_running():
+        await message.answer(get_message(ui_lang, "profile_busy"))
+        return
+    
+    await message.answer(get_message(ui_lang, "profile_started", duration=duration))
+    try:
+        stacks = await profiler.profile(duration, config.profile_interval)
+    except RuntimeError:
+        await message.answer(get_message(ui_lang, "profile_busy"))
+        return
+    
+    samples = sum(int(line.rsplit(" ", 1)[1]) for line in stacks.splitlines())
+    await message.answer_document(
+        BufferedInputFile(stacks.encode("utf-8"), filename=f"profile-{int(time.time())}.folded"),
+        caption=get_message(ui_lang, "profile_finished", duration=duration, samples=samples)
+    )
     
-@router.callback_query(F.data.startswith("lang_"))
+@router.callback_query(F.data.startswith("lang_"), flags={"skip_subscription": True})
 async def process_language_callback(callback: CallbackQuery):
     """
     Handle language selection callback.
@@ -271,123 +298,45 @@ async def process_language_callback(callback: CallbackQuery):
     await callback.answer()
 
 @router.callback_query(F.data.startswith("source_"))
-async def process_source_language_callback(callback: CallbackQuery):
+async def process_source_language_callback(callback: CallbackQuery, ctx: UserContext):
     """
     Handle source language selection callback.
     
     Args:
         callback: Callback query object
+        ctx: User context
     """
-    user_id = callback.from_user.id
     source_lang_code = callback.data.split('_')[1]
+    ui_lang = ctx.ui_lang
     
-    # Get current user
-    user_data = await get_user(user_id)
-    ui_lang = user_data["ui_lang"] if user_data and "ui_lang" in user_data else "en"
-    
-    # Check subscription before proceeding
-    is_subscribed = await check_user_subscription(callback.bot, user_id)
-    if not is_subscribed:
-        # Update user's subscription status
-        await update_subscription_status(user_id, False)
-        
-        # Create channel links list
-        channel_links = ""
-        for channel in config.required_channels:
-            # Extract channel username/ID for display
-            if channel.startswith('@'):
-                channel_name = channel
-                channel_link = f"https://t.me/{channel[1:]}"
-            else:
-                try:
-                    chat = await callback.bot.get_chat(channel)
-                    channel_name = chat.title or channel
-                    if chat.username:
-                        channel_link = f"https://t.me/{chat.username}"
-                    else:
-                        channel_link = f"Channel ID: {channel}"
-                except Exception as e:
-                    logging.error(f"Error getting channel info: {e}")
-                    channel_name = channel
-                    channel_link = f"Channel ID: {channel}"
-            
-            channel_links += f"• <a href='{channel_link}'>{channel_name}</a>\n"
-        
-        await callback.message.edit_text(
-            get_message(ui_lang, "subscription_required", channel_links=channel_links),
-            reply_markup=get_subscription_keyboard(ui_lang),
-            parse_mode="HTML",
-            disable_web_page_preview=True
-        )
-        await callback.answer()
-        return
-        
     # Show target language selection keyboard
     source_lang_name = LANGUAGES[source_lang_code]
     localized_source_lang = localize_language_names(ui_lang, source_lang_name, "")[0]
     
     await callback.message.edit_text(
         get_message(ui_lang, "selected_source", source_lang=localized_source_lang),
-        reply_markup=get_target_language_keyboard(source_lang_code)
+        reply_markup=get_target_language_keyboard(source_lang_code, ui_lang)
     )
     await callback.answer()
 
 @router.callback_query(F.data.startswith("target_"))
-async def process_target_language_callback(callback: CallbackQuery):
+async def process_target_language_callback(callback: CallbackQuery, ctx: UserContext):
     """
     Handle target language selection callback.
     
     Args:
         callback: Callback query object
+        ctx: User context
     """
     user_id = callback.from_user.id
     parts = callback.data.split('_')
     source_lang_code = parts[1]
     target_lang_code = parts[2]
     
-    # Get current user
-    user_data = await get_user(user_id)
-    ui_lang = user_data["ui_lang"] if user_data and "ui_lang" in user_data else "en"
-    
-    # Check subscription before proceeding
-    is_subscribed = await check_user_subscription(callback.bot, user_id)
-    if not is_subscribed:
-        # Update user's subscription status
-        await update_subscription_status(user_id, False)
-        
-        # Create channel links list
-        channel_links = ""
-        for channel in config.required_channels:
-            # Extract channel username/ID for display
-            if channel.startswith('@'):
-                channel_name = channel
-                channel_link = f"https://t.me/{channel[1:]}"
-            else:
-                try:
-                    chat = await callback.bot.get_chat(channel)
-                    channel_name = chat.title or channel
-                    if chat.username:
-                        channel_link = f"https://t.me/{chat.username}"
-                    else:
-                        channel_link = f"Channel ID: {channel}"
-                except Exception as e:
-                    logging.error(f"Error getting channel info: {e}")
-                    channel_name = channel
-                    channel_link = f"Channel ID: {channel}"
-            
-            channel_links += f"• <a href='{channel_link}'>{channel_name}</a>\n"
-        
-        await callback.message.edit_text(
-            get_message(ui_lang, "subscription_required", channel_links=channel_links),
-            reply_markup=get_subscription_keyboard(ui_lang),
-            parse_mode="HTML",
-            disable_web_page_preview=True
-        )
-        await callback.answer()
-        return
+    ui_lang = ctx.ui_lang
     
     # Store user's translation direction
-    user_states[user_id] = {
+    user_states[scoped(user_id)] = {
         "source_lang_code": source_lang_code,
         "target_lang_code": target_lang_code
     }
@@ -403,39 +352,95 @@ async def process_target_language_callback(callback: CallbackQuery):
     )
     await callback.answer()
 
-@router.callback_query(F.data == "check_subscription")
-async def process_check_subscription_callback(callback: CallbackQuery):
+@router.callback_query(F.data.startswith("multi_"))
+async def process_multi_target_callback(callback: CallbackQuery, ctx: UserContext):
     """
-    Handle subscription check button callback.
+    Handle toggling of a target language in multi-target selection.
     
     Args:
         callback: Callback query object
+        ctx: User context
+    """
+    _, source_lang_code, selection = callback.data.split('_', 2)
+    selected_codes = selection.split('-') if selection else []
+    
+    if len(selected_codes) > config.max_target_languages:
+        await callback.answer(
+            get_message(ctx.ui_lang, "too_many_targets", max_targets=config.max_target_languages),
+            show_alert=True
+        )
+        return
+    
+    await callback.message.edit_reply_markup(
+        reply_markup=get_multi_target_language_keyboard(source_lang_code, selected_codes, ctx.ui_lang)
+    )
+    await callback.answer()
+
+@router.callback_query(F.data.startswith("multidone_"))
+async def process_multi_done_callback(callback: CallbackQuery, ctx: UserContext):
+    """
+    Handle confirmation of multi-target selection.
+    
+    Args:
+        callback: Callback query object
+        ctx: User context
     """
     user_id = callback.from_user.id
+    _, source_lang_code, selection = callback.data.split('_', 2)
+    target_lang_codes = selection.split('-')
+    
+    ui_lang = ctx.ui_lang
+    
+    # Store user's translation directions, the first target is used where only one fits
+    user_states[scoped(user_id)] = {
+        "source_lang_code": source_lang_code,
+        "target_lang_code": target_lang_codes[0],
+        "target_lang_codes": target_lang_codes
+    }
+    
+    # Localize language names
+    source_lang_name = localize_language_names(ui_lang, LANGUAGES[source_lang_code])[0]
+    target_lang_names = ", ".join(
+        localize_language_names(ui_lang, LANGUAGES[lang_code])[0]
+        for lang_code in target_lang_codes
+    )
+    
+    await callback.message.edit_text(
+        get_message(ui_lang, "selected", from_lang=source_lang_name, to_lang=target_lang_names)
+    )
+    await callback.answer()
+
+@router.callback_query(F.data == "check_subscription", flags={"skip_subscription": True})
+async def process_check_subscription_callback(callback: CallbackQuery, ctx: UserContext):
+    """
+    Handle subscription check button callback.
     
-    # Get user from database
-    user_data = await get_user(user_id)
-    ui_lang = user_data["ui_lang"] if user_data and "ui_lang" in user_data else "en"
+    Args:
+        callback: Callback query object
+        ctx: User context
+    """
+    user_id = callback.from_user.id
+    ui_lang = ctx.ui_lang
     
-    # Check subscription status
-    is_subscribed = await check_user_subscription(callback.bot, user_id)
+    # Always check live, the user may have just subscribed
+    memberships = await get_channel_memberships(callback.bot, user_id)
+    is_subscribed = bool(verdict_from_memberships(memberships))
+    remember_verdict(user_id, is_subscribed)
+    if memberships:
+        await update_channel_memberships(user_id, memberships)
     
     if is_subscribed:
         # Update user's subscription status
         await update_subscription_status(user_id, True)
         
         await callback.message.edit_text(
-            get_message(ui_lang, "subscription_verified") + 
-            "\n\n🎁 This bot is completely free! Thank you for subscribing to our channels.",
+            get_message(ui_lang, "subscription_verified_promo"),
             disable_web_page_preview=True
         )
         
         # Send welcome message with language keyboard
         await callback.message.answer(
-            get_message(ui_lang, "welcome") + 
-            "\n\n🔥 Check out my other useful bots:\n" +
-            "🎬 @Vidzillabot - Video processing and editing\n" +
-            "🔊 @voiceletbot - Voice message tools",
+            get_message(ui_lang, "welcome_verified"),
             reply_markup=get_language_keyboard()
         )
     else:
@@ -443,30 +448,10 @@ async def process_check_subscription_callback(callback: CallbackQuery):
         await update_subscription_status(user_id, False)
         
         # Create channel links list
-        channel_links = ""
-        for channel in config.required_channels:
-            # Extract channel username/ID for display
-            if channel.startswith('@'):
-                channel_name = channel
-                channel_link = f"https://t.me/{channel[1:]}"
-            else:
-                try:
-                    chat = await callback.bot.get_chat(channel)
-                    channel_name = chat.title or channel
-                    if chat.username:
-                        channel_link = f"https://t.me/{chat.username}"
-                    else:
-                        channel_link = f"Channel ID: {channel}"
-                except Exception as e:
-                    logging.error(f"Error getting channel info: {e}")
-                    channel_name = channel
-                    channel_link = f"Channel ID: {channel}"
-            
-            channel_links += f"• <a href='{channel_link}'>{channel_name}</a>\n"
+        channel_links = await get_channel_links(callback.bot)
         
         await callback.message.edit_text(
-            get_message(ui_lang, "subscription_not_verified", channel_links=channel_links) +
-            "\n\n🎁 This bot is completely free! You just need to subscribe to continue using it.",
+            get_message(ui_lang, "subscription_not_verified_promo", channel_links=channel_links),
             reply_markup=get_subscription_keyboard(ui_lang),
             parse_mode="HTML",
             disable_web_page_preview=True
@@ -474,7 +459,7 @@ async def process_check_subscription_callback(callback: CallbackQuery):
     
     await callback.answer()
 
-@router.callback_query(F.data == "ignore")
+@router.callback_query(F.data == "ignore", flags={"skip_subscription": True})
 async def process_ignore_callback(callback: CallbackQuery):
     """
     Handle ignore callback for title buttons.
@@ -484,60 +469,278 @@ async def process_ignore_callback(callback: CallbackQuery):
     """
     await callback.answer()
 
-@router.message()
-async def translate_message(message: Message):
+async def answer_inline_translation(query: InlineQuery, text: str, translated_text: str, target_lang_code: str):
     """
-    Handle text messages and translate them.
+    Answer an inline query with a translation result.
+    
+    Args:
+        query: Inline query object
+        text: Source text
+        translated_text: Translated text
+        target_lang_code: Target language code
+    """
+    result_id = hashlib.md5(f"{target_lang_code}:{text}".encode()).hexdigest()
+    
+    await query.answer(
+        [
+            InlineQueryResultArticle(
+                id=result_id,
+                title=LANGUAGES[target_lang_code],
+                description=translated_text[:100],
+                input_message_content=InputTextMessageContent(message_text=translated_text)
+            )
+        ],
+        cache_time=config.inline_cache_time,
+        is_personal=True
+    )
+
+async def process_inline_query(query: InlineQuery, text: str, source_lang_code: str, target_lang_code: str):
+    """
+    Translate an inline query after the debounce delay.
+    
+    Args:
+        query: Inline query object
+        text: Text to translate
+        source_lang_code: Source language code
+        target_lang_code: Target language code
+    """
+    # Wait for the user to stop typing; a newer query cancels this one
+    await asyncio.sleep(config.inline_debounce)
+    
+    translated_text = await translate_text(
+        text,
+        LANGUAGES[source_lang_code],
+        LANGUAGES[target_lang_code],
+        user_id=query.from_user.id
+    )
+    await answer_inline_translation(query, text, translated_text, target_lang_code)
+
+@router.inline_query()
+async def inline_translate(query: InlineQuery, ctx: UserContext):
+    """
+    Handle inline queries and translate them in the last used direction.
+    
+    Args:
+        query: Inline query object
+        ctx: User context
+    """
+    user_id = query.from_user.id
+    text = query.query.strip()
+    
+    # Cancel the translation of the previous keystroke
+    previous_task = inline_tasks.pop(scoped(user_id), None)
+    if previous_task:
+        previous_task.cancel()
+    
+    if not text:
+        return
+    
+    if ctx.direction is None:
+        await query.answer(
+            [],
+            cache_time=0,
+            is_personal=True,
+            button=InlineQueryResultsButton(text=get_message(ctx.ui_lang, "inline_select_languages"), start_parameter="inline")
+        )
+        return
+    
+    source_lang_code = ctx.direction["source_lang_code"]
+    target_lang_code = ctx.direction["target_lang_code"]
+    
+    # Answer instantly from the translation memory when possible
+    cached_text = lookup_translation(text, LANGUAGES[source_lang_code], LANGUAGES[target_lang_code])
+    if cached_text is not None:
+        await answer_inline_translation(query, text, cached_text, target_lang_code)
+        return
+    
+    previous_task = inline_tasks.get(scoped(user_id))
+    if previous_task:
+        previous_task.cancel()
+    
+    task = asyncio.create_task(process_inline_query(query, text, source_lang_code, target_lang_code))
+    inline_tasks[scoped(user_id)] = task
+    try:
+        await task
+    except asyncio.CancelledError:
+        logging.debug(f"Inline query superseded: {user_id}")
+    except Overloaded:
+        await query.answer(
+            [],
+            cache_time=0,
+            is_personal=True,
+            button=InlineQueryResultsButton(text=get_message(ctx.ui_lang, "inline_overloaded"), start_parameter="inline")
+        )
+    except Exception as e:
+        logging.error(f"Inline translation error: {e}")
+    finally:
+        if inline_tasks.get(scoped(user_id)) is task:
+            del inline_tasks[scoped(user_id)]
+
+@router.chat_member()
+async def track_channel_membership(event: ChatMemberUpdated):
+    """
+    Update a user's subscription when they join or leave a required channel.
+    
+    The bot receives these updates only in channels where it is an admin.
+    
+    Args:
+        event: Chat member update
+    """
+    channel = required_channel(event.chat)
+    user = event.new_chat_member.user
+    if channel is None or user.is_bot:
+        return
+    
+    memberships = await update_channel_memberships(user.id, {channel: is_member(event.new_chat_member)})
+    if memberships is None:
+        # Users who never started the bot are checked when they do
+        return
+    
+    subscribed = bool(verdict_from_memberships(memberships))
+    remember_verdict(user.id, subscribed)
+    await update_subscription_status(user.id, subscribed, active=False)
+
+@router.channel_post(F.text)
+async def pretranslate_channel_post(message: Message):
+    """
+    Pre-translate new posts of the required channels into the most used language pairs.
+    
+    The bot receives channel posts only in channels where it is an admin.
+    
+    Args:
+        message: Channel post
+    """
+    if not is_required_channel(message.chat) or len(message.text) > config.max_text_length:
+        return
+    
+    schedule_pretranslation(message.text, message.chat.id)
+
+@router.message(F.document)
+async def translate_document_message(message: Message, ctx: UserContext):
+    """
+    Handle documents and translate them segment by segment.
     
     Args:
         message: Telegram message object
+        ctx: User context
     """
     user_id = message.from_user.id
+    ui_lang = ctx.ui_lang
     
-    # Get user from database
-    user_data = await get_user(user_id)
-    ui_lang = user_data["ui_lang"] if user_data and "ui_lang" in user_data else "en"
-    
-    # Check subscription before proceeding
-    is_subscribed = await check_user_subscription(message.bot, user_id)
-    if not is_subscribed:
-        # Update user's subscription status
-        await update_subscription_status(user_id, False)
-        
-        # Create channel links list
-        channel_links = ""
-        for channel in config.required_channels:
-            # Extract channel username/ID for display
-            if channel.startswith('@'):
-                channel_name = channel
-                channel_link = f"https://t.me/{channel[1:]}"
-            else:
-                try:
-                    chat = await message.bot.get_chat(channel)
-                    channel_name = chat.title or channel
-                    if chat.username:
-                        channel_link = f"https://t.me/{chat.username}"
-                    else:
-                        channel_link = f"Channel ID: {channel}"
-                except Exception as e:
-                    logging.error(f"Error getting channel info: {e}")
-                    channel_name = channel
-                    channel_link = f"Channel ID: {channel}"
-            
-            channel_links += f"• <a href='{channel_link}'>{channel_name}</a>\n"
-        
+    if ctx.direction is None:
         await message.answer(
-            get_message(ui_lang, "subscription_required", channel_links=channel_links),
-            reply_markup=get_subscription_keyboard(ui_lang),
-            parse_mode="HTML",
-            disable_web_page_preview=True
+            get_message(ui_lang, "select_first"),
+            reply_markup=get_language_keyboard()
         )
         return
     
-    # If we got here, the user is subscribed
-    await update_subscription_status(user_id, True)
+    document = message.document
+    file_name = document.file_name or "document.txt"
+    stem, extension = os.path.splitext(file_name)
+    extension = extension.lower()
+    
+    if extension not in PARSERS:
+        await message.answer(get_message(ui_lang, "document_unsupported"))
+        return
+    
+    if document.file_size and document.file_size > config.document_max_size:
+        await message.answer(get_message(ui_lang, "document_too_large"))
+        return
+    
+    source_lang_code = ctx.direction["source_lang_code"]
+    target_lang_code = ctx.direction["target_lang_code"]
+    
+    await message.answer(get_message(ui_lang, "document_started", file_name=file_name))
+    
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            source_path = os.path.join(directory, f"source{extension}")
+            target_path = os.path.join(directory, f"{stem}.{target_lang_code}{extension}")
+            
+            # Stream the file to disk instead of into memory
+            await message.bot.download(document, destination=source_path)
+            # Documents are heavy, they yield to message translations under load
+            with background():
+                await translate_document(
+                    source_path,
+                    target_path,
+                    extension,
+                    LANGUAGES[source_lang_code],
+                    LANGUAGES[target_lang_code],
+                    user_id=user_id
+                )
+            await message.answer_document(FSInputFile(target_path))
+    except Overloaded:
+        await message.answer(get_message(ui_lang, "overloaded"))
+    except Exception as e:
+        logging.error(f"Document translation error: {e}")
+        await message.answer(get_message(ui_lang, "error"))
+
+async def translate_fan_out(message: Message, ui_lang: str, text: str, source_lang_code: str, target_lang_codes: list):
+    """
+    Translate a message into several languages concurrently.
+    
+    Each translation is sent as soon as it is ready, so the total latency
+    is close to that of the slowest single translation.
+    
+    Args:
+        message: Telegram message object
+        ui_lang: UI language code
+        text: Text to translate
+        source_lang_code: Source language code
+        target_lang_codes: Target language codes
+    """
+    user_id = message.from_user.id
+    source_lang = LANGUAGES[source_lang_code]
+    segments, separators = split_segments(text)
+    replies = []
+    
+    async def translate_to(target_lang_code):
+        try:
+            return target_lang_code, await translate_segments(segments, source_lang, LANGUAGES[target_lang_code], user_id=user_id), None
+        except Overloaded:
+            return target_lang_code, None, "overloaded"
+        except Exception as e:
+            logging.error(f"Translation error ({target_lang_code}): {e}")
+            return target_lang_code, None, "error"
     
-    if user_id not in user_states:
+    for next_result in asyncio.as_completed([translate_to(lang_code) for lang_code in target_lang_codes]):
+        target_lang_code, translations, error_key = await next_result
+        target_lang_name = localize_language_names(ui_lang, LANGUAGES[target_lang_code])[0]
+        
+        if translations is None:
+            await message.answer(f"{target_lang_name}\n{get_message(ui_lang, error_key)}")
+            continue
+        
+        prefix = f"{target_lang_name}\n"
+        reply = await message.answer(prefix + join_segments(translations, separators))
+        replies.append({
+            "message_id": reply.message_id,
+            "target_lang_code": target_lang_code,
+            "prefix": prefix,
+            "translations": translations
+        })
+    
+    remember_reply(message.chat.id, message.message_id, {
+        "source_lang_code": source_lang_code,
+        "segments": segments,
+        "edit_date": None,
+        "replies": replies
+    })
+
+@router.message(F.text)
+async def translate_message(message: Message, ctx: UserContext):
+    """
+    Handle text messages and translate them.
+    
+    Args:
+        message: Telegram message object
+        ctx: User context
+    """
+    user_id = message.from_user.id
+    ui_lang = ctx.ui_lang
+    
+    if ctx.direction is None:
         await message.answer(
             get_message(ui_lang, "select_first"),
             reply_markup=get_language_keyboard()
@@ -545,18 +748,108 @@ async def translate_message(message: Message):
         return
     
     text = message.text
-    if len(text) > 2000:
+    if len(text) > config.max_text_length:
         await message.answer(get_message(ui_lang, "text_too_long"))
         return
     
-    source_lang_code = user_states[user_id]["source_lang_code"]
-    target_lang_code = user_states[user_id]["target_lang_code"]
+    source_lang_code = ctx.direction["source_lang_code"]
+    target_lang_code = ctx.direction["target_lang_code"]
     source_lang = LANGUAGES[source_lang_code]
     target_lang = LANGUAGES[target_lang_code]
     
+    target_lang_codes = ctx.direction.get("target_lang_codes")
+    if target_lang_codes and len(target_lang_codes) > 1:
+        await translate_fan_out(message, ui_lang, text, source_lang_code, target_lang_codes)
+        return
+    
     try:
-        translated_text = await translate_text(text, source_lang, target_lang)
-        await message.answer(translated_text)
+        segments, separators = split_segments(text)
+        translations = await translate_segments(segments, source_lang, target_lang, user_id=user_id)
+        reply = await message.answer(join_segments(translations, separators))
+    except Overloaded:
+        await message.answer(get_message(ui_lang, "overloaded"))
+        return
     except Exception as e:
         logging.error(f"Translation error: {e}")
-        await message.answer(get_message(ui_lang, "error")) 
\ No newline at end of file
+        await message.answer(get_message(ui_lang, "error"))
+        return
+    
+    # Remember the reply so an edit of the message updates it
+    remember_reply(message.chat.id, message.message_id, {
+        "source_lang_code": source_lang_code,
+        "segments": segments,
+        "edit_date": None,
+        "replies": [{
+            "message_id": reply.message_id,
+            "target_lang_code": target_lang_code,
+            "prefix": "",
+            "translations": translations
+        }]
+    })
+
+@router.edited_message(F.text)
+async def retranslate_edited_message(message: Message, ctx: UserContext):
+    """
+    Update the translations of an edited message in place.
+    
+    Only the segments that changed are translated again.
+    
+    Args:
+        message: Edited Telegram message object
+        ctx: User context
+    """
+    record = get_reply_record(message.chat.id, message.message_id)
+    if record is None:
+        return
+    
+    text = message.text
+    if len(text) > config.max_text_length:
+        await message.answer(get_message(ctx.ui_lang, "text_too_long"))
+        return
+    
+    # Newer edits win if several are being translated at once
+    edit_date = message.edit_date
+    record["edit_date"] = edit_date
+    
+    segments, separators = split_segments(text)
+    source_lang = LANGUAGES[record["source_lang_code"]]
+    
+    async def update_reply(reply):
+        translations = await retranslate_segments(
+            record["segments"],
+            reply["translations"],
+            segments,
+            source_lang,
+            LANGUAGES[reply["target_lang_code"]],
+            user_id=message.from_user.id
+        )
+        if record["edit_date"] != edit_date:
+            return None
+        
+        try:
+            await message.bot.edit_message_text(
+                reply["prefix"] + join_segments(translations, separators),
+                chat_id=message.chat.id,
+                message_id=reply["message_id"]
+            )
+        except TelegramBadRequest as e:
+            # The reply was deleted, or the edit did not change the translation
+            logging.info(f"Reply not updated: {e}")
+        return translations
+    
+    try:
+        results = await asyncio.gather(*(update_reply(reply) for reply in record["replies"]))
+    except Overloaded:
+        await message.answer(get_message(ctx.ui_lang, "overloaded"))
+        return
+    except Exception as e:
+        logging.error(f"Translation error: {e}")
+        await message.answer(get_message(ctx.ui_lang, "error"))
+        return
+    
+    if record["edit_date"] != edit_date:
+        return
+    
+    for reply, translations in zip(record["replies"], results):
+        reply["translations"] = translations
+    record["segments"] = segments
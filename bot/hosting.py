@@ -0,0 +1,83 @@
+"""
+Hosting of several Telegram bots in one process.
+
+All bots are polled by one dispatcher and share the MongoDB client, the
+X.AI session and the translation memory. Each update is handled in the
+context of the bot that received it, which namespaces the database
+collections, the required channels and the in-memory state per bot.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+from config import config, BotConfig
+
+# Configuration of the bot the current task works for
+_current_bot: ContextVar = ContextVar("current_bot", default=None)
+
+# Hosted bot configurations by bot ID
+_hosted = {}
+
+def current_bot() -> BotConfig:
+    """
+    Get the configuration of the bot the current task works for.
+
+    Returns:
+        Bot configuration, the first configured bot outside of any bot context
+    """
+    return _current_bot.get() or config.bots[0]
+
+def scoped(key) -> tuple:
+    """
+    Make an in-memory state key private to the current bot.
+
+    Args:
+        key: Key such as a user or chat ID
+
+    Returns:
+        Key combined with the bot namespace
+    """
+    return (current_bot().namespace, key)
+
+@contextmanager
+def use_bot(bot_config: BotConfig):
+    """
+    Work for the given bot inside the block.
+
+    Tasks created inside the block inherit the bot.
+
+    Args:
+        bot_config: Bot configuration
+    """
+    token = _current_bot.set(bot_config)
+    try:
+        yield
+    finally:
+        _current_bot.reset(token)
+
+class HostingMiddleware(BaseMiddleware):
+    """
+    Outer update middleware that handles each update for the bot that received it.
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        with use_bot(_hosted[data["bot"].id]):
+            return await handler(event, data)
+
+def setup_hosting(dp, bots: list):
+    """
+    Register the hosted bots with the dispatcher.
+
+    Args:
+        dp: Dispatcher
+        bots: List of (Telegram Bot instance, bot configuration) pairs
+    """
+    for bot, bot_config in bots:
+        _hosted[bot.id] = bot_config
+    dp.update.outer_middleware(HostingMiddleware())
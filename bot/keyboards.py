@@ -3,7 +3,7 @@ Keyboard module for the NinjaTranslate bot.
 """
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 from bot.translations import LANGUAGES
-from bot.localization import get_message, get_language_name
+from bot.localization import get_message, get_language_name, UI_LANGUAGES, LANGUAGE_FLAGS
 
 def get_language_keyboard():
     """
@@ -30,12 +30,13 @@ def get_language_keyboard():
     builder.adjust(1, 2, 2, 2)  # First row for title, then 2 buttons per row
     return builder.as_markup()
 
-def get_target_language_keyboard(source_lang_code):
+def get_target_language_keyboard(source_lang_code, ui_lang: str):
     """
     Create an inline keyboard to select target language.
     
     Args:
         source_lang_code: Source language code selected by user
+        ui_lang: UI language code
     
     Returns:
         Inline keyboard markup with target language buttons
@@ -56,6 +57,61 @@ def get_target_language_keyboard(source_lang_code):
                 callback_data=f"target_{source_lang_code}_{lang_code}"
             )
     
+    # Switch to multi-target selection
+    builder.button(
+        text=get_message(ui_lang, "multi_targets_button"),
+        callback_data=f"multi_{source_lang_code}_"
+    )
+    
+    builder.adjust(1, 2, 2, 2)  # First row for title, then 2 buttons per row
+    return builder.as_markup()
+
+def get_multi_target_language_keyboard(source_lang_code, selected_codes, ui_lang: str):
+    """
+    Create an inline keyboard to select several target languages.
+    
+    The current selection is encoded in the callback data of every button,
+    so toggling a language needs no server-side state.
+    
+    Args:
+        source_lang_code: Source language code selected by user
+        selected_codes: Target language codes selected so far
+        ui_lang: UI language code
+    
+    Returns:
+        Inline keyboard markup with toggleable target language buttons
+    """
+    builder = InlineKeyboardBuilder()
+    
+    # Title button (not clickable)
+    builder.button(
+        text="🎯 SELECT TARGET LANGUAGES 🎯",
+        callback_data="ignore"
+    )
+    
+    # Add language buttons, excluding source language
+    for lang_code, lang_name in LANGUAGES.items():
+        if lang_code == source_lang_code:
+            continue
+        
+        if lang_code in selected_codes:
+            toggled_codes = [code for code in selected_codes if code != lang_code]
+            lang_name = f"✅ {lang_name}"
+        else:
+            toggled_codes = [*selected_codes, lang_code]
+        
+        builder.button(
+            text=lang_name,
+            callback_data=f"multi_{source_lang_code}_{'-'.join(toggled_codes)}"
+        )
+    
+    # Confirmation button
+    if selected_codes:
+        builder.button(
+            text=get_message(ui_lang, "multi_done_button", count=len(selected_codes)),
+            callback_data=f"multidone_{source_lang_code}_{'-'.join(selected_codes)}"
+        )
+    
     builder.adjust(1, 2, 2, 2)  # First row for title, then 2 buttons per row
     return builder.as_markup()
 
@@ -72,17 +128,14 @@ def get_ui_language_keyboard(ui_lang: str):
     builder = InlineKeyboardBuilder()
     
     # Add language buttons
-    for lang_code in ["en", "ar"]:
+    for lang_code in UI_LANGUAGES:
         lang_name = get_language_name(ui_lang, lang_code)
         # Add a ✓ mark to the current language
         if lang_code == ui_lang:
             lang_name = f"✅ {lang_name}"
         
-        # Add emoji flags
-        flag = "🇬🇧" if lang_code == "en" else "🇸🇦" if lang_code == "ar" else ""
-        
         builder.button(
-            text=f"{flag} {lang_name}",
+            text=f"{LANGUAGE_FLAGS[lang_code]} {lang_name}",
             callback_data=f"lang_{lang_code}"
         )
             
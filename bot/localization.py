@@ -1,69 +1,147 @@
 """
 Localization module for the NinjaTranslate bot.
+
+UI languages are loaded from the JSON resource files in bot/locales at
+import time into a flat, read-only message table. Adding a file there is
+enough to add a new interface language.
 """
-from bot.translations import AR_LANG_NAMES
-
-# Messages in both languages
-MESSAGES = {
-    "en": {
-        "welcome": "Welcome to NinjaTranslate! Please select source language:",
-        "selected": "Selected {from_lang} → {to_lang} translation.\nSend me text to translate (max 2000 characters).",
-        "selected_source": "Source language: {source_lang}\nNow select target language:",
-        "select_source": "Please select source language:",
-        "select_first": "Please select source language first:",
-        "text_too_long": "Text is too long. Maximum is 2000 characters.",
-        "error": "Error during translation. Please try again later.",
-        "language_cmd": "Select interface language:",
-        "language_selected": "Interface language set to English.",
-        "stats": "📊 Bot Statistics\n\n👥 Total Users: {total_users}\n🇬🇧 English UI: {english_ui}\n🇸🇦 Arabic UI: {arabic_ui}\n💫 Subscribed Users: {subscribed_users}",
-        "subscription_required": "⚠️ Subscription Required ⚠️\n\nTo use NinjaTranslate bot, you need to subscribe to the following channels:\n\n{channel_links}\n\nAfter subscribing, click the \"Check Subscription\" button below.",
-        "subscription_check": "Check Subscription",
-        "subscription_verified": "✅ Thank you! Your subscription has been verified. You can now use the bot.",
-        "subscription_not_verified": "❌ You need to subscribe to all required channels to use the bot.\n\nPlease subscribe to:\n\n{channel_links}\n\nAfter subscribing, click the \"Check Subscription\" button again."
-    },
-    "ar": {
-        "welcome": "مرحبًا بك في NinjaTranslate! يرجى اختيار لغة المصدر:",
-        "selected": "تم اختيار الترجمة من {from_lang} إلى {to_lang}.\nأرسل لي النص المراد ترجمته (بحد أقصى 2000 حرف).",
-        "selected_source": "لغة المصدر: {source_lang}\nاختر الآن لغة الهدف:",
-        "select_source": "يرجى اختيار لغة المصدر:",
-        "select_first": "يرجى اختيار لغة المصدر أولاً:",
-        "text_too_long": "النص طويل جدًا. الحد الأقصى هو 2000 حرف.",
-        "error": "حدث خطأ أثناء الترجمة. يرجى المحاولة مرة أخرى لاحقًا.",
-        "language_cmd": "اختر لغة الواجهة:",
-        "language_selected": "تم ضبط لغة الواجهة على العربية.",
-        "stats": "📊 إحصائيات البوت\n\n👥 إجمالي المستخدمين: {total_users}\n🇬🇧 واجهة إنجليزية: {english_ui}\n🇸🇦 واجهة عربية: {arabic_ui}\n💫 المستخدمون المشتركون: {subscribed_users}",
-        "subscription_required": "⚠️ الاشتراك مطلوب ⚠️\n\nلاستخدام بوت NinjaTranslate، يجب عليك الاشتراك في القنوات التالية:\n\n{channel_links}\n\nبعد الاشتراك، انقر على زر \"التحقق من الاشتراك\" أدناه.",
-        "subscription_check": "التحقق من الاشتراك",
-        "subscription_verified": "✅ شكراً لك! تم التحقق من اشتراكك. يمكنك الآن استخدام البوت.",
-        "subscription_not_verified": "❌ يجب عليك الاشتراك في جميع القنوات المطلوبة لاستخدام البوت.\n\nيرجى الاشتراك في:\n\n{channel_links}\n\nبعد الاشتراك، انقر على زر \"التحقق من الاشتراك\" مرة أخرى."
-    }
-}
+import json
+import logging
+from pathlib import Path
+from string import Formatter
+from types import MappingProxyType
+from bot.translations import LANGUAGE_CODES
+
+# Directory with one <lang>.json resource file per UI language
+LOCALES_DIR = Path(__file__).parent / "locales"
 
-# Language names in both languages
-LANGUAGE_NAMES = {
-    "en": {
-        "en": "English",
-        "ar": "Arabic"
-    },
-    "ar": {
-        "en": "الإنجليزية",
-        "ar": "العربية"
-    }
+# Fallback language for missing messages
+DEFAULT_LANG = "en"
+
+# Messages built by joining static parts once at load time
+COMPOSED_MESSAGES = {
+    "start": ("welcome", "promo_start"),
+    "welcome_verified": ("welcome", "promo_welcome"),
+    "subscription_required_promo": ("subscription_required", "promo_subscribe"),
+    "subscription_verified_promo": ("subscription_verified", "promo_verified"),
+    "subscription_not_verified_promo": ("subscription_not_verified", "promo_not_verified")
 }
 
+def _placeholders(template: str) -> frozenset:
+    """
+    Get the names of the format placeholders in a template.
+    
+    Args:
+        template: Message template
+        
+    Returns:
+        Set of placeholder names
+    """
+    return frozenset(field for _, field, _, _ in Formatter().parse(template) if field)
+
+def _load_locales() -> dict:
+    """
+    Load all locale resource files.
+    
+    Returns:
+        Dictionary of locale data by language code, default language first
+    """
+    locales = {}
+    for path in sorted(LOCALES_DIR.glob("*.json"), key=lambda path: path.stem != DEFAULT_LANG):
+        with open(path, encoding="utf-8") as file:
+            locales[path.stem] = json.load(file)
+    return locales
+
+def find_placeholder_mismatches(locales: dict) -> list:
+    """
+    Find translated messages that use different placeholders than the default language.
+    
+    Args:
+        locales: Locale data by language code
+        
+    Returns:
+        List of (language, message key) pairs
+    """
+    default_messages = locales[DEFAULT_LANG]["messages"]
+    return [
+        (lang, key)
+        for lang, locale in locales.items()
+        for key, template in locale["messages"].items()
+        if key in default_messages and _placeholders(template) != _placeholders(default_messages[key])
+    ]
+
+def _compile_messages(locales: dict) -> dict:
+    """
+    Build the flat message table keyed by (language, message key).
+    
+    Missing messages, and translations whose placeholders differ from the
+    default language, fall back to the default language. Composed messages
+    are joined once here instead of on every call.
+    
+    Args:
+        locales: Locale data by language code
+        
+    Returns:
+        Dictionary mapping (lang, key) to message template
+    """
+    default_messages = locales[DEFAULT_LANG]["messages"]
+    mismatches = set(find_placeholder_mismatches(locales))
+    table = {}
+    
+    for lang, locale in locales.items():
+        messages = {**default_messages, **locale["messages"]}
+        
+        for key in default_messages:
+            if (lang, key) in mismatches:
+                logging.error(f"Placeholder mismatch in {lang}.json for '{key}', using {DEFAULT_LANG}.json")
+                messages[key] = default_messages[key]
+        
+        for key, parts in COMPOSED_MESSAGES.items():
+            messages[key] = "".join(messages[part] for part in parts)
+        
+        for key, template in messages.items():
+            table[(lang, key)] = template
+    
+    return table
+
+_LOCALES = _load_locales()
+
+# Available UI languages, default language first
+UI_LANGUAGES = tuple(_LOCALES)
+
+# Flat read-only message table
+MESSAGES = MappingProxyType(_compile_messages(_LOCALES))
+
+# Names of UI languages in every UI language
+LANGUAGE_NAMES = MappingProxyType({
+    (ui_lang, lang_code): _LOCALES[ui_lang].get("ui_languages", {}).get(lang_code, _LOCALES[lang_code]["name"])
+    for ui_lang in UI_LANGUAGES
+    for lang_code in UI_LANGUAGES
+})
+
+# Flags of UI languages
+LANGUAGE_FLAGS = MappingProxyType({lang: _LOCALES[lang].get("flag", "") for lang in UI_LANGUAGES})
+
+# Localized names of translation languages
+TRANSLATION_LANGUAGE_NAMES = MappingProxyType({
+    (ui_lang, lang_code): name
+    for ui_lang in UI_LANGUAGES
+    for lang_code, name in _LOCALES[ui_lang].get("language_names", {}).items()
+})
+
 def get_message(lang: str, key: str, **kwargs) -> str:
     """
     Get a localized message.
     
     Args:
-        lang: Language code (en/ar)
+        lang: UI language code
         key: Message key
         **kwargs: Format parameters
         
     Returns:
         Localized message
     """
-    message = MESSAGES.get(lang, MESSAGES["en"]).get(key, MESSAGES["en"][key])
+    message = MESSAGES.get((lang, key)) or MESSAGES[(DEFAULT_LANG, key)]
     if kwargs:
         return message.format(**kwargs)
     return message
@@ -73,17 +151,16 @@ def localize_language_names(lang: str, from_lang: str, to_lang: str = None) -> t
     Localize language names for the UI.
     
     Args:
-        lang: UI language (en/ar)
+        lang: UI language code
         from_lang: Source language name
         to_lang: Target language name
         
     Returns:
         Tuple of localized language names
     """
-    if lang == "ar":
-        from_lang = AR_LANG_NAMES.get(from_lang, from_lang)
-        if to_lang:
-            to_lang = AR_LANG_NAMES.get(to_lang, to_lang)
+    from_lang = TRANSLATION_LANGUAGE_NAMES.get((lang, LANGUAGE_CODES.get(from_lang)), from_lang)
+    if to_lang:
+        to_lang = TRANSLATION_LANGUAGE_NAMES.get((lang, LANGUAGE_CODES.get(to_lang)), to_lang)
     
     if to_lang is None:
         return (from_lang,)
@@ -91,13 +168,13 @@ def localize_language_names(lang: str, from_lang: str, to_lang: str = None) -> t
 
 def get_language_name(ui_lang: str, lang_code: str) -> str:
     """
-    Get localized name of a language.
+    Get localized name of a UI language.
     
     Args:
-        ui_lang: UI language (en/ar)
+        ui_lang: UI language code
         lang_code: Language code to get name for
         
     Returns:
         Localized language name
     """
-    return LANGUAGE_NAMES.get(ui_lang, LANGUAGE_NAMES["en"]).get(lang_code, lang_code) 
\ No newline at end of file
+    return LANGUAGE_NAMES.get((ui_lang, lang_code)) or LANGUAGE_NAMES.get((DEFAULT_LANG, lang_code), lang_code)
@@ -0,0 +1,117 @@
+"""
+Masking of non-translatable spans for the NinjaTranslate bot.
+
+URLs, mentions, hashtags, code, emoji and numbers are replaced with compact
+⟦n⟧ placeholders before a segment is sent to the model and restored
+afterwards, so they cost fewer tokens and come back exactly as written.
+Spans no longer than their placeholder are left in the text, and texts
+that already contain placeholder brackets are not masked at all.
+"""
+import logging
+import re
+
+# One scanner for all span types, alternatives are tried in order
+_SPANS = re.compile(
+    r"```[\s\S]*?(?:```|\Z)"                                  # fenced code, possibly unclosed
+    r"|`[^`\n]+`"                                              # inline code
+    r"|(?:https?://|www\.)[^\s<>\"'⟦]*[^\s<>\"'⟦.,;:!?)\]]"    # URLs without trailing punctuation
+    r"|[\w.+-]+@[\w-]+(?:\.[\w-]+)+"                           # emails
+    r"|(?<!\w)@\w{3,}"                                         # mentions
+    r"|(?<!\w)#\w+"                                            # hashtags
+    r"|[\U0001F000-\U0001FAFF\u2600-\u27BF\uFE0F\u200D]+"      # emoji, flags and sequences
+    r"|(?<![\w⟦])\d{4}-\d\d-\d\d(?:[ T]\d\d?:\d\d(?::\d\d)?)?(?![\w⟧])"  # ISO dates with a time
+    r"|(?<![\w⟦])[-+]?\d+(?:[.,:/-]\d+)*%?(?![\w⟧])"           # numbers, dates and times
+)
+
+_PLACEHOLDER = re.compile(r"⟦(\d+)⟧")
+_BRACKETS = re.compile(r"[⟦⟧]")
+
+# Letters in any script, what is left after masking must contain one to be translated
+_LETTER = re.compile(r"[^\W\d_]")
+
+def mask(text: str) -> tuple:
+    """
+    Replace non-translatable spans with numbered placeholders.
+
+    Args:
+        text: Source text
+
+    Returns:
+        Tuple of (masked text, list of original spans by placeholder number)
+    """
+    spans = []
+    if _BRACKETS.search(text):
+        # The user's own brackets would be mistaken for placeholders
+        return text, spans
+
+    def replace(match):
+        placeholder = f"⟦{len(spans)}⟧"
+        if len(match.group(0)) <= len(placeholder):
+            return match.group(0)
+        spans.append(match.group(0))
+        return placeholder
+
+    return _SPANS.sub(replace, text), spans
+
+def unmask(text: str, spans: list) -> str:
+    """
+    Restore placeholders with their original spans.
+
+    Args:
+        text: Masked text, e.g. a translation of mask() output
+        spans: Original spans returned by mask()
+
+    Returns:
+        Text with the spans restored
+    """
+    if not spans:
+        return text
+    return _PLACEHOLDER.sub(
+        lambda match: spans[int(match.group(1))] if int(match.group(1)) < len(spans) else match.group(0),
+        text
+    )
+
+def placeholders_match(masked: str, translated: str) -> bool:
+    """
+    Check if a translation kept every placeholder of its source exactly once.
+
+    Args:
+        masked: Masked source text
+        translated: Masked translation
+
+    Returns:
+        True if both texts contain the same placeholders
+    """
+    return sorted(_PLACEHOLDER.findall(masked)) == sorted(_PLACEHOLDER.findall(translated))
+
+def restore_missing(translated: str, spans: list) -> str:
+    """
+    Restore a translation whose placeholders were changed by the model.
+
+    Spans the model dropped are appended, so nothing the user wrote is lost.
+
+    Args:
+        translated: Masked translation
+        spans: Original spans returned by mask()
+
+    Returns:
+        Translation with all spans present
+    """
+    kept = {int(number) for number in _PLACEHOLDER.findall(translated)}
+    missing = [span for number, span in enumerate(spans) if number not in kept]
+    if missing:
+        logging.warning(f"Translation dropped {len(missing)} placeholder(s)")
+        translated = translated.rstrip() + " " + " ".join(missing)
+    return unmask(translated, spans)
+
+def is_translatable(masked: str) -> bool:
+    """
+    Check if masked text has anything left to translate.
+
+    Args:
+        masked: Masked text
+
+    Returns:
+        True if the text contains letters outside placeholders
+    """
+    return bool(_LETTER.search(masked))
@@ -0,0 +1,247 @@
+"""
+Translation memory for the NinjaTranslate bot.
+
+Stores translated segment pairs per language pair. Exact segment hits are
+reused as-is, near-duplicates are found through a MinHash/LSH index over
+character n-grams and handed to the translator as hints.
+"""
+import re
+import zlib
+from collections import OrderedDict
+from config import config
+
+# Paragraph boundaries used to split texts into segments
+_SEGMENT_SEPARATOR = re.compile(r"\s*\n\s*\n\s*")
+_WHITESPACE = re.compile(r"\s+")
+
+# MinHash parameters: 60 permutations split into 20 bands of 3 rows
+_NUM_PERM = 60
+_BAND_ROWS = 3
+_SHINGLE_SIZE = 3
+_MERSENNE_PRIME = (1 << 61) - 1
+_PERMUTATIONS = tuple(
+    (
+        zlib.crc32(f"a{i}".encode()) | 1,
+        zlib.crc32(f"b{i}".encode())
+    )
+    for i in range(_NUM_PERM)
+)
+
+def split_segments(text: str) -> tuple:
+    """
+    Split text into paragraph segments.
+
+    Args:
+        text: Text to split
+
+    Returns:
+        Tuple of (segments, separators) such that joining them back in
+        alternating order reproduces the original text
+    """
+    stripped = text.strip()
+    if not stripped:
+        return [""], [text, ""]
+
+    start = text.index(stripped)
+    end = start + len(stripped)
+
+    segments = []
+    separators = [text[:start]]
+    position = start
+    for match in _SEGMENT_SEPARATOR.finditer(text, start, end):
+        segments.append(text[position:match.start()])
+        separators.append(match.group())
+        position = match.end()
+
+    segments.append(text[position:end])
+    separators.append(text[end:])
+    return segments, separators
+
+def join_segments(segments: list, separators: list) -> str:
+    """
+    Reassemble segments produced by split_segments.
+
+    Args:
+        segments: Translated segments
+        separators: Separators returned by split_segments
+
+    Returns:
+        Reassembled text
+    """
+    parts = [separators[0]]
+    for segment, separator in zip(segments, separators[1:]):
+        parts.append(segment)
+        parts.append(separator)
+    return "".join(parts)
+
+def normalize_segment(segment: str) -> str:
+    """
+    Normalize a segment for exact-match lookups.
+
+    Args:
+        segment: Source segment
+
+    Returns:
+        Segment with collapsed whitespace
+    """
+    return _WHITESPACE.sub(" ", segment).strip()
+
+def _minhash(segment: str) -> tuple:
+    """
+    Compute the MinHash signature of a normalized segment.
+
+    Args:
+        segment: Normalized segment
+
+    Returns:
+        Tuple of _NUM_PERM signature values
+    """
+    lowered = segment.lower()
+    if len(lowered) <= _SHINGLE_SIZE:
+        shingles = {lowered}
+    else:
+        shingles = {lowered[i:i + _SHINGLE_SIZE] for i in range(len(lowered) - _SHINGLE_SIZE + 1)}
+    hashes = [zlib.crc32(shingle.encode()) for shingle in shingles]
+
+    return tuple(
+        min((a * h + b) % _MERSENNE_PRIME for h in hashes)
+        for a, b in _PERMUTATIONS
+    )
+
+def _bands(signature: tuple):
+    """
+    Yield LSH band keys for a signature.
+
+    Args:
+        signature: MinHash signature
+    """
+    for start in range(0, _NUM_PERM, _BAND_ROWS):
+        yield start, signature[start:start + _BAND_ROWS]
+
+def _similarity(first: tuple, second: tuple) -> float:
+    """
+    Estimate Jaccard similarity from two MinHash signatures.
+    """
+    return sum(1 for a, b in zip(first, second) if a == b) / _NUM_PERM
+
+class _PairMemory:
+    """
+    Segment store for a single language pair.
+    """
+
+    def __init__(self, max_segments: int):
+        self.max_segments = max_segments
+        # normalized source -> (source, translation, signature)
+        self.entries = OrderedDict()
+        # band key -> set of normalized sources
+        self.buckets = {}
+
+    def get(self, key: str):
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.entries.move_to_end(key)
+        return entry
+
+    def put(self, key: str, source: str, translation: str):
+        if key in self.entries:
+            _, _, signature = self.entries.pop(key)
+        else:
+            signature = _minhash(key)
+            for band in _bands(signature):
+                self.buckets.setdefault(band, set()).add(key)
+        self.entries[key] = (source, translation, signature)
+
+        while len(self.entries) > self.max_segments:
+            old_key, (_, _, old_signature) = self.entries.popitem(last=False)
+            for band in _bands(old_signature):
+                bucket = self.buckets.get(band)
+                if bucket is not None:
+                    bucket.discard(old_key)
+                    if not bucket:
+                        del self.buckets[band]
+
+    def closest(self, key: str, threshold: float):
+        signature = _minhash(key)
+        candidates = set()
+        for band in _bands(signature):
+            candidates.update(self.buckets.get(band, ()))
+
+        best = None
+        best_score = threshold
+        for candidate in candidates:
+            source, translation, candidate_signature = self.entries[candidate]
+            score = _similarity(signature, candidate_signature)
+            if score >= best_score:
+                best = (source, translation, score)
+                best_score = score
+        return best
+
+class TranslationMemory:
+    """
+    In-process translation memory keyed by language pair.
+    """
+
+    def __init__(self, max_segments: int = 5000, fuzzy_threshold: float = 0.5):
+        self.max_segments = max_segments
+        self.fuzzy_threshold = fuzzy_threshold
+        self._pairs = {}
+
+    def _pair(self, source_lang: str, target_lang: str) -> _PairMemory:
+        pair = self._pairs.get((source_lang, target_lang))
+        if pair is None:
+            pair = _PairMemory(self.max_segments)
+            self._pairs[(source_lang, target_lang)] = pair
+        return pair
+
+    def lookup(self, source_lang: str, target_lang: str, segment: str):
+        """
+        Find an exact translation of a segment.
+
+        Args:
+            source_lang: Source language
+            target_lang: Target language
+            segment: Source segment
+
+        Returns:
+            Stored translation or None if the segment is unknown
+        """
+        entry = self._pair(source_lang, target_lang).get(normalize_segment(segment))
+        return entry[1] if entry is not None else None
+
+    def suggest(self, source_lang: str, target_lang: str, segment: str):
+        """
+        Find the closest stored segment for use as a translation hint.
+
+        Args:
+            source_lang: Source language
+            target_lang: Target language
+            segment: Source segment
+
+        Returns:
+            Tuple of (source, translation, similarity) or None
+        """
+        key = normalize_segment(segment)
+        if not key:
+            return None
+        return self._pair(source_lang, target_lang).closest(key, self.fuzzy_threshold)
+
+    def store(self, source_lang: str, target_lang: str, segment: str, translation: str):
+        """
+        Store a translated segment.
+
+        Args:
+            source_lang: Source language
+            target_lang: Target language
+            segment: Source segment
+            translation: Translated segment
+        """
+        key = normalize_segment(segment)
+        if not key or not translation.strip():
+            return
+        self._pair(source_lang, target_lang).put(key, segment, translation)
+
+# Shared translation memory instance
+memory = TranslationMemory(
+    max_segments=config.memory_max_segments,
+    fuzzy_threshold=config.memory_fuzzy_threshold
+)
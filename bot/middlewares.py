@@ -0,0 +1,228 @@
+"""
+Middlewares for the NinjaTranslate bot.
+"""
+import asyncio
+import logging
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, Optional
+from aiogram import BaseMiddleware
+from aiogram.dispatcher.flags import get_flag
+from aiogram.types import TelegramObject, CallbackQuery, InlineQuery, InlineQueryResultsButton
+from config import config
+from bot.db import get_user, update_subscription_status, update_channel_memberships, touch_user
+from bot.hosting import scoped
+from bot.keyboards import get_subscription_keyboard
+from bot.localization import get_message
+from bot.state import user_states
+from bot.tasks import in_background
+from bot.subscription import (
+    is_admin,
+    get_cached_verdict,
+    remember_verdict,
+    check_user_subscription,
+    get_channel_links,
+    get_channel_memberships,
+    verdict_from_memberships
+)
+
+@dataclass
+class UserContext:
+    """
+    Per-update data about the user, loaded once by ContextMiddleware.
+    """
+    user_id: int
+    ui_lang: str
+    user_data: Optional[dict]
+    direction: Optional[dict]
+    subscribed: bool
+    is_admin: bool
+
+def _checked_within(user_data, interval: timedelta) -> bool:
+    """
+    Check if the user's subscription was checked recently.
+
+    Args:
+        user_data: User document
+        interval: Maximum age of the last check
+
+    Returns:
+        True if the subscription was checked within the interval
+    """
+    last_checked = (user_data or {}).get("subscription_last_checked")
+    return bool(last_checked) and datetime.now(timezone.utc) - last_checked < interval
+
+def _stored_verdict(user_data) -> bool:
+    """
+    Check if the stored subscription verdict is positive and still fresh.
+
+    Args:
+        user_data: User document
+
+    Returns:
+        True if the user was verified within subscription_check_interval
+    """
+    if not user_data or not user_data.get("subscription_verified"):
+        return False
+    return _checked_within(user_data, timedelta(minutes=config.subscription_check_interval))
+
+async def _store_memberships(user_id: int, memberships: dict, subscribed: bool):
+    """
+    Save the result of a live subscription check.
+
+    Args:
+        user_id: Telegram user ID
+        memberships: Dictionary of channel to membership
+        subscribed: Subscription verdict
+    """
+    if memberships:
+        await update_channel_memberships(user_id, memberships)
+    await update_subscription_status(user_id, subscribed)
+
+async def load_user_context(bot, user_id: int) -> UserContext:
+    """
+    Load user profile, translation direction and subscription verdict.
+
+    With subscription_events on, the verdict comes from channel memberships
+    stored by chat_member updates; unknown users and users not checked for
+    subscription_recheck_hours are checked live, which covers updates the
+    bot missed.
+    Otherwise the profile fetch and the live subscription check run
+    concurrently; the live check is skipped when a verdict is cached and
+    cancelled when the stored one turns out to be fresh.
+
+    Args:
+        bot: Telegram Bot instance
+        user_id: Telegram user ID
+
+    Returns:
+        User context
+    """
+    admin = is_admin(user_id)
+    subscribed = True if admin else get_cached_verdict(user_id)
+
+    if subscribed is not None:
+        user_data = await get_user(user_id)
+    elif config.subscription_events:
+        # Memberships are kept current by chat_member updates, unknown or stale users are checked live
+        user_data = await get_user(user_id)
+        subscribed = verdict_from_memberships((user_data or {}).get("channels") or {})
+        if subscribed is None or not _checked_within(user_data, timedelta(hours=config.subscription_recheck_hours)):
+            memberships = await get_channel_memberships(bot, user_id)
+            subscribed = bool(verdict_from_memberships(memberships))
+            in_background(_store_memberships(user_id, memberships, subscribed))
+        else:
+            in_background(touch_user(user_id))
+
+        remember_verdict(user_id, subscribed)
+    else:
+        # Verdicts are refreshed once per interval, which also keeps last_activity current
+        live_check = asyncio.create_task(check_user_subscription(bot, user_id))
+        user_data = await get_user(user_id)
+
+        if _stored_verdict(user_data):
+            live_check.cancel()
+            subscribed = True
+            in_background(touch_user(user_id))
+        else:
+            subscribed = await live_check
+            in_background(update_subscription_status(user_id, subscribed))
+
+        remember_verdict(user_id, subscribed)
+
+    return UserContext(
+        user_id=user_id,
+        ui_lang=user_data["ui_lang"] if user_data and "ui_lang" in user_data else "en",
+        user_data=user_data,
+        direction=user_states.get(scoped(user_id)),
+        subscribed=subscribed,
+        is_admin=admin
+    )
+
+async def send_subscription_required(event: TelegramObject, ctx: UserContext):
+    """
+    Tell an unsubscribed user which channels to join.
+
+    Args:
+        event: Message, callback query or inline query
+        ctx: User context
+    """
+    if isinstance(event, InlineQuery):
+        await event.answer(
+            [],
+            cache_time=0,
+            is_personal=True,
+            button=InlineQueryResultsButton(text=get_message(ctx.ui_lang, "inline_subscribe"), start_parameter="inline")
+        )
+        return
+
+    channel_links = await get_channel_links(event.bot)
+
+    if isinstance(event, CallbackQuery):
+        await event.message.edit_text(
+            get_message(ctx.ui_lang, "subscription_required", channel_links=channel_links),
+            reply_markup=get_subscription_keyboard(ctx.ui_lang),
+            parse_mode="HTML",
+            disable_web_page_preview=True
+        )
+        await event.answer()
+        return
+
+    await event.answer(
+        get_message(ctx.ui_lang, "subscription_required_promo", channel_links=channel_links),
+        reply_markup=get_subscription_keyboard(ctx.ui_lang),
+        parse_mode="HTML",
+        disable_web_page_preview=True
+    )
+
+class ContextMiddleware(BaseMiddleware):
+    """
+    Outer middleware that loads the user context once per update.
+
+    Group chats are left alone, outer middlewares run before the router's
+    private chat filter.
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        user = data.get("event_from_user")
+        chat = data.get("event_chat")
+        if user is not None and (chat is None or chat.type == "private"):
+            data["ctx"] = await load_user_context(data["bot"], user.id)
+        return await handler(event, data)
+
+class SubscriptionMiddleware(BaseMiddleware):
+    """
+    Inner middleware that stops unsubscribed users before the handler runs.
+
+    Handlers flagged with skip_subscription run regardless of the verdict.
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        ctx = data.get("ctx")
+        if ctx is None or ctx.subscribed or get_flag(data, "skip_subscription"):
+            return await handler(event, data)
+
+        logging.info(f"Unsubscribed user stopped: {ctx.user_id}")
+        await send_subscription_required(event, ctx)
+        return None
+
+def setup_middlewares(router):
+    """
+    Register the context and subscription middlewares on a router.
+
+    Args:
+        router: Router with the bot handlers
+    """
+    for observer in (router.message, router.edited_message, router.callback_query, router.inline_query):
+        observer.outer_middleware(ContextMiddleware())
+        observer.middleware(SubscriptionMiddleware())
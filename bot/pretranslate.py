@@ -0,0 +1,71 @@
+"""
+Pre-translation of posts from the required channels.
+
+New posts are translated in the background into the language pairs used
+by the most users, which seeds the translation memory before users start
+forwarding the post to the bot.
+"""
+import asyncio
+import logging
+import time
+from config import config
+from bot.admission import Overloaded, speculative
+from bot.db import get_top_language_pairs
+from bot.hosting import current_bot
+from bot.tasks import in_background
+from bot.translations import LANGUAGES, translate_text
+
+# Cached top language pairs by bot namespace: (pairs, load time)
+_top_pairs = {}
+
+# Pre-translations run one at a time by default so user requests come first
+_semaphore = asyncio.Semaphore(config.pretranslate_concurrency)
+
+async def _get_top_pairs() -> list:
+    """
+    Get the current bot's most used language pairs, refreshed every pretranslate_refresh seconds.
+
+    Returns:
+        List of (source language code, target language code) tuples
+    """
+    namespace = current_bot().namespace
+    pairs, loaded = _top_pairs.get(namespace, ([], 0.0))
+
+    if time.monotonic() - loaded > config.pretranslate_refresh or not pairs:
+        pairs = await get_top_language_pairs(config.pretranslate_pairs)
+        _top_pairs[namespace] = (pairs, time.monotonic())
+    return pairs
+
+async def pretranslate_post(text: str, chat_id: int):
+    """
+    Translate a channel post into the most used language pairs.
+
+    Args:
+        text: Post text
+        chat_id: Channel chat ID, token usage is recorded under it
+    """
+    async with _semaphore:
+        for source_code, target_code in await _get_top_pairs():
+            if source_code not in LANGUAGES or target_code not in LANGUAGES:
+                continue
+            try:
+                with speculative():
+                    await translate_text(text, LANGUAGES[source_code], LANGUAGES[target_code], user_id=chat_id)
+            except Overloaded:
+                logging.info(f"Pre-translation of post from channel {chat_id} shed")
+                return
+            except Exception as e:
+                logging.error(f"Pre-translation error: {e}")
+                return
+
+    logging.info(f"Pre-translated post from channel {chat_id}")
+
+def schedule_pretranslation(text: str, chat_id: int):
+    """
+    Pre-translate a channel post in the background.
+
+    Args:
+        text: Post text
+        chat_id: Channel chat ID
+    """
+    in_background(pretranslate_post(text, chat_id))
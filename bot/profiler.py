@@ -0,0 +1,89 @@
+"""
+On-demand sampling profiler for the NinjaTranslate bot.
+
+A background thread samples the event loop thread's stack at a fixed
+interval and aggregates the samples into folded stacks, the input format
+of flamegraph.pl and speedscope.
+"""
+import asyncio
+import sys
+import threading
+import time
+from collections import Counter
+
+# Set while a profile is being collected, only one may run at a time
+_running = threading.Event()
+
+def _frame_name(frame) -> str:
+    """
+    Describe a stack frame for a folded stack line.
+
+    Args:
+        frame: Python frame
+
+    Returns:
+        Function name with file and first line
+    """
+    code = frame.f_code
+    return f"{code.co_name} ({code.co_filename}:{code.co_firstlineno})"
+
+def _sample(thread_id: int, duration: float, interval: float) -> Counter:
+    """
+    Sample a thread's stack until the duration has passed.
+
+    Args:
+        thread_id: Identifier of the thread to sample
+        duration: Profiling duration in seconds
+        interval: Seconds between samples
+
+    Returns:
+        Counter of folded stacks, root frame first
+    """
+    stacks = Counter()
+    deadline = time.monotonic() + duration
+
+    while time.monotonic() < deadline:
+        frame = sys._current_frames().get(thread_id)
+        names = []
+        while frame is not None:
+            names.append(_frame_name(frame))
+            frame = frame.f_back
+        if names:
+            stacks[";".join(reversed(names))] += 1
+        time.sleep(interval)
+
+    return stacks
+
+def is_running() -> bool:
+    """
+    Check if a profile is being collected.
+
+    Returns:
+        True if the profiler is running
+    """
+    return _running.is_set()
+
+async def profile(duration: float, interval: float) -> str:
+    """
+    Profile the event loop thread for a while.
+
+    Args:
+        duration: Profiling duration in seconds
+        interval: Seconds between samples
+
+    Returns:
+        Folded stacks, one "frame;frame;frame count" line per stack
+
+    Raises:
+        RuntimeError: If a profile is already running
+    """
+    if _running.is_set():
+        raise RuntimeError("Profiler is already running")
+
+    _running.set()
+    try:
+        stacks = await asyncio.to_thread(_sample, threading.get_ident(), duration, interval)
+    finally:
+        _running.clear()
+
+    return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
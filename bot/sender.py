@@ -0,0 +1,287 @@
+"""
+Rate-aware outbound sender for the NinjaTranslate bot.
+
+Every message-sending Telegram API call passes through a bot session
+middleware that queues it per chat, enforces per-chat and global send
+rates, waits out flood control and retries, and coalesces rapid edits
+of the same message. Interactive replies are served before bulk traffic
+such as broadcasts.
+"""
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import (
+    CopyMessage,
+    EditMessageReplyMarkup,
+    EditMessageText,
+    ForwardMessage,
+    SendDocument,
+    SendMessage
+)
+from config import config
+
+# Priorities, lower is served first
+INTERACTIVE = 0
+BULK = 1
+
+# Methods that count against Telegram's send limits
+RATE_LIMITED_METHODS = (
+    SendMessage,
+    SendDocument,
+    CopyMessage,
+    ForwardMessage,
+    EditMessageText,
+    EditMessageReplyMarkup
+)
+
+# Methods whose pending calls for the same message are merged
+COALESCED_METHODS = (EditMessageText, EditMessageReplyMarkup)
+
+# Priority of calls made in the current task
+_priority: ContextVar = ContextVar("send_priority", default=INTERACTIVE)
+
+class RateLimiter:
+    """
+    Token bucket limiting how many requests are sent per second.
+
+    Waiters are served by priority, then in arrival order.
+    """
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.capacity = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._waiters = []
+        self._order = itertools.count()
+        self._timer = None
+
+    def _take(self) -> bool:
+        """
+        Take a token if one is available.
+
+        Returns:
+            True if a token was taken
+        """
+        now = time.monotonic()
+        if now < self.paused_until:
+            return False
+
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def _wake(self):
+        """
+        Hand out tokens to waiters and schedule the next wake-up.
+        """
+        self._timer = None
+        while self._waiters:
+            future = self._waiters[0][2]
+            if future.done():
+                heapq.heappop(self._waiters)
+                continue
+            if not self._take():
+                break
+            heapq.heappop(self._waiters)
+            future.set_result(None)
+
+        if self._waiters:
+            now = time.monotonic()
+            delay = max(self.paused_until - now, (1 - self.tokens) / self.rate, 0)
+            self._timer = asyncio.get_running_loop().call_later(delay, self._wake)
+
+    async def acquire(self, priority: int = INTERACTIVE):
+        """
+        Wait until a request may be sent.
+
+        Args:
+            priority: Waiter priority, lower is served first
+        """
+        if not self._waiters and self._take():
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._order), future))
+        if self._timer is None:
+            self._wake()
+
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # The token was handed out just before cancellation, give it back
+                self.tokens = min(self.capacity, self.tokens + 1)
+            raise
+
+    def pause(self, seconds: float):
+        """
+        Stop handing out tokens for the given number of seconds.
+
+        Args:
+            seconds: Pause duration, e.g. Telegram's retry_after
+        """
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._waiters:
+            self._wake()
+
+    def idle(self) -> bool:
+        """
+        Check if the limiter has no waiters and a full bucket.
+
+        Returns:
+            True if the limiter can be dropped without losing state
+        """
+        now = time.monotonic()
+        tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        return not self._waiters and tokens >= self.capacity and now >= self.paused_until
+
+@contextmanager
+def priority(level: int):
+    """
+    Send calls made inside the block with the given priority.
+
+    Tasks created inside the block inherit the priority.
+
+    Args:
+        level: INTERACTIVE or BULK
+    """
+    token = _priority.set(level)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+class SenderMiddleware(BaseRequestMiddleware):
+    """
+    Bot session middleware that paces, retries and coalesces outgoing messages.
+    """
+
+    def __init__(self):
+        self.global_limiter = RateLimiter(config.sender_global_rate, burst=int(config.sender_global_rate))
+        self.bulk_limiter = RateLimiter(config.broadcast_rate)
+        self.chat_limiters = {}
+        self.pending_edits = {}
+
+    def _chat_limiter(self, chat_id) -> RateLimiter:
+        """
+        Get the rate limiter of a chat.
+
+        Args:
+            chat_id: Chat ID or @username
+
+        Returns:
+            Rate limiter of the chat
+        """
+        limiter = self.chat_limiters.get(chat_id)
+        if limiter is None:
+            if len(self.chat_limiters) >= config.sender_max_chats:
+                for idle_chat_id in [key for key, value in self.chat_limiters.items() if value.idle()]:
+                    del self.chat_limiters[idle_chat_id]
+
+            # Groups and channels have a much lower limit than private chats
+            is_private = isinstance(chat_id, int) and chat_id > 0
+            rate = config.sender_chat_rate if is_private else config.sender_group_rate
+            limiter = RateLimiter(rate, burst=config.sender_chat_burst)
+            self.chat_limiters[chat_id] = limiter
+        return limiter
+
+    async def _send(self, make_request, bot, method, level: int, edit: dict = None):
+        """
+        Send a call once the rate limits allow it, retrying on flood control.
+
+        Args:
+            make_request: Next request handler in the chain
+            bot: Telegram Bot instance
+            method: Telegram API method
+            level: Call priority
+            edit: Pending edit entry for coalesced calls
+
+        Returns:
+            Telegram API response
+        """
+        chat_limiter = self._chat_limiter(method.chat_id) if getattr(method, "chat_id", None) is not None else None
+
+        for attempt in range(config.sender_max_retries):
+            if chat_limiter is not None:
+                await chat_limiter.acquire(level)
+            if level == BULK:
+                await self.bulk_limiter.acquire(level)
+            await self.global_limiter.acquire(level)
+
+            if edit is not None:
+                newer = self.pending_edits.get(edit["key"])
+                if newer is not None and newer is not edit:
+                    # A newer edit was queued while we waited out flood control
+                    return await asyncio.shield(newer["future"])
+                # Send the newest content queued so far, later edits queue anew
+                self.pending_edits.pop(edit["key"], None)
+                method = edit["method"]
+
+            try:
+                return await make_request(bot, method)
+            except TelegramRetryAfter as e:
+                if attempt == config.sender_max_retries - 1:
+                    raise
+                logging.warning(f"Flood control on {type(method).__name__}, retrying after {e.retry_after}s")
+                if level == BULK:
+                    self.bulk_limiter.pause(e.retry_after)
+                if chat_limiter is not None:
+                    chat_limiter.pause(e.retry_after)
+                else:
+                    await asyncio.sleep(e.retry_after)
+
+    async def __call__(self, make_request, bot, method):
+        if not isinstance(method, RATE_LIMITED_METHODS):
+            return await make_request(bot, method)
+
+        level = _priority.get()
+        if not isinstance(method, COALESCED_METHODS):
+            return await self._send(make_request, bot, method, level)
+
+        key = (bot.id, method.chat_id, method.message_id, method.inline_message_id, type(method))
+        pending = self.pending_edits.get(key)
+        if pending is not None:
+            # An edit of this message is still queued, replace its content
+            pending["method"] = method
+            return await asyncio.shield(pending["future"])
+
+        edit = {"key": key, "method": method, "future": asyncio.get_running_loop().create_future()}
+        self.pending_edits[key] = edit
+        try:
+            response = await self._send(make_request, bot, method, level, edit)
+            edit["future"].set_result(response)
+            return response
+        except asyncio.CancelledError:
+            edit["future"].cancel()
+            raise
+        except Exception as e:
+            edit["future"].set_exception(e)
+            # Mark the error as retrieved, coalesced callers may not exist
+            edit["future"].exception()
+            raise
+        finally:
+            if self.pending_edits.get(key) is edit:
+                del self.pending_edits[key]
+
+def setup_sender(bot):
+    """
+    Route the bot's outgoing messages through the sender.
+
+    Args:
+        bot: Telegram Bot instance
+    """
+    bot.session.middleware(SenderMiddleware())
@@ -0,0 +1,40 @@
+"""
+Shared in-memory state for the NinjaTranslate bot.
+"""
+from collections import OrderedDict
+from config import config
+from bot.hosting import scoped
+
+# User states dictionary (for translation direction) by (bot namespace, user ID)
+user_states = {}
+
+# Bot replies by (bot namespace, (chat ID, source message ID)), used to re-translate edited messages
+reply_records = OrderedDict()
+
+def remember_reply(chat_id: int, message_id: int, record: dict):
+    """
+    Remember the replies sent for a source message.
+    
+    Args:
+        chat_id: Chat ID
+        message_id: Source message ID
+        record: Source language, segments and the replies with their translations
+    """
+    key = scoped((chat_id, message_id))
+    reply_records[key] = record
+    reply_records.move_to_end(key)
+    while len(reply_records) > config.reply_records_size:
+        reply_records.popitem(last=False)
+
+def get_reply_record(chat_id: int, message_id: int):
+    """
+    Get the replies sent for a source message.
+    
+    Args:
+        chat_id: Chat ID
+        message_id: Source message ID
+        
+    Returns:
+        Reply record, or None if the message is unknown or forgotten
+    """
+    return reply_records.get(scoped((chat_id, message_id)))
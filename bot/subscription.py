@@ -0,0 +1,202 @@
+"""
+Subscription checks for the NinjaTranslate bot.
+"""
+import logging
+import os
+import time
+from config import config
+from bot.hosting import current_bot, scoped
+
+# Admin user IDs
+ADMIN_IDS = os.getenv("ADMIN_IDS", "").split(",")  # Replace with your actual admin ID(s)
+
+# In-memory subscription verdicts: (bot namespace, user ID) -> (subscribed, expiry time)
+_verdicts = {}
+
+def is_admin(user_id: int) -> bool:
+    """
+    Check if a user is a bot admin.
+
+    Args:
+        user_id: Telegram user ID
+
+    Returns:
+        True if the user is an admin
+    """
+    return str(user_id) in ADMIN_IDS
+
+def get_cached_verdict(user_id: int):
+    """
+    Get a cached subscription verdict.
+
+    Args:
+        user_id: Telegram user ID
+
+    Returns:
+        True or False if a fresh verdict is cached, None otherwise
+    """
+    key = scoped(user_id)
+    verdict = _verdicts.get(key)
+    if verdict is None:
+        return None
+    if verdict[1] < time.monotonic():
+        del _verdicts[key]
+        return None
+    return verdict[0]
+
+def remember_verdict(user_id: int, subscribed: bool, ttl: float = None):
+    """
+    Cache a subscription verdict.
+
+    Positive verdicts are kept for subscription_check_interval, negative ones
+    only briefly so users who just subscribed are not blocked for long.
+
+    Args:
+        user_id: Telegram user ID
+        subscribed: Whether the user is subscribed
+        ttl: Verdict lifetime in seconds, chosen from the config by default
+    """
+    if ttl is None:
+        ttl = config.subscription_check_interval * 60 if subscribed else config.subscription_negative_ttl
+
+    now = time.monotonic()
+    if len(_verdicts) > config.subscription_cache_size:
+        # Drop expired verdicts before the cache grows further
+        for expired_key in [key for key, (_, expires) in _verdicts.items() if expires < now]:
+            del _verdicts[expired_key]
+
+    _verdicts[scoped(user_id)] = (subscribed, now + ttl)
+
+def required_channel(chat):
+    """
+    Find the required channel a chat is configured as.
+
+    Args:
+        chat: Telegram chat object
+
+    Returns:
+        Channel as written in required_channels, or None if the chat is not required
+    """
+    for channel in current_bot().required_channels:
+        if channel == str(chat.id):
+            return channel
+        if chat.username and channel.lower() == f"@{chat.username.lower()}":
+            return channel
+    return None
+
+def is_required_channel(chat) -> bool:
+    """
+    Check if a chat is one of the required channels.
+
+    Args:
+        chat: Telegram chat object
+
+    Returns:
+        True if the chat is configured in required_channels
+    """
+    return required_channel(chat) is not None
+
+def is_member(chat_member) -> bool:
+    """
+    Check if a chat member counts as subscribed.
+
+    Args:
+        chat_member: Telegram chat member object
+
+    Returns:
+        True if the user is a member of the chat
+    """
+    if chat_member.status in ("member", "administrator", "creator"):
+        return True
+    return chat_member.status == "restricted" and bool(getattr(chat_member, "is_member", False))
+
+def verdict_from_memberships(memberships: dict):
+    """
+    Decide the subscription verdict from stored channel memberships.
+
+    Args:
+        memberships: Dictionary of channel to membership
+
+    Returns:
+        True or False if every required channel is known, None otherwise
+    """
+    bot_config = current_bot()
+    if not bot_config.validate_channels():
+        return True
+    if not all(channel in memberships for channel in bot_config.required_channels):
+        return None
+    return all(memberships[channel] for channel in bot_config.required_channels)
+
+async def get_channel_memberships(bot, user_id: int) -> dict:
+    """
+    Check with getChatMember which required channels a user is a member of.
+
+    Args:
+        bot: Telegram Bot instance
+        user_id: Telegram user ID
+
+    Returns:
+        Dictionary of channel to membership, channels that could not be checked are left out
+    """
+    memberships = {}
+    bot_config = current_bot()
+    if not bot_config.validate_channels():
+        return memberships
+
+    for channel in bot_config.required_channels:
+        try:
+            memberships[channel] = is_member(await bot.get_chat_member(channel, user_id))
+        except Exception as e:
+            logging.error(f"Error checking subscription status: {e}")
+
+    return memberships
+
+async def check_user_subscription(bot, user_id: int):
+    """
+    Check if user is subscribed to all required channels.
+
+    Args:
+        bot: Telegram Bot instance
+        user_id: Telegram user ID
+
+    Returns:
+        True if subscribed to all required channels, False otherwise
+    """
+    if not current_bot().validate_channels():
+        # If no channels are configured, assume subscription is verified
+        return True
+
+    return bool(verdict_from_memberships(await get_channel_memberships(bot, user_id)))
+
+async def get_channel_links(bot) -> str:
+    """
+    Build the HTML list of required channel links.
+
+    Args:
+        bot: Telegram Bot instance
+
+    Returns:
+        HTML list of channel links
+    """
+    channel_links = ""
+    for channel in current_bot().required_channels:
+        # Extract channel username/ID for display
+        if channel.startswith('@'):
+            channel_name = channel
+            channel_link = f"https://t.me/{channel[1:]}"
+        else:
+            try:
+                chat = await bot.get_chat(channel)
+                channel_name = chat.title or channel
+                if chat.username:
+                    channel_link = f"https://t.me/{chat.username}"
+                else:
+                    channel_link = f"Channel ID: {channel}"
+            except Exception as e:
+                logging.error(f"Error getting channel info: {e}")
+                channel_name = channel
+                channel_link = f"Channel ID: {channel}"
+
+        channel_links += f"• <a href='{channel_link}'>{channel_name}</a>\n"
+
+    return channel_links
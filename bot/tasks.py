@@ -0,0 +1,22 @@
+"""
+Background tasks for the NinjaTranslate bot.
+"""
+import asyncio
+
+# References to running background tasks so they are not garbage collected
+_background_tasks = set()
+
+def in_background(coro) -> asyncio.Task:
+    """
+    Run a coroutine without waiting for it.
+
+    Args:
+        coro: Coroutine to run
+
+    Returns:
+        Created task
+    """
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return task
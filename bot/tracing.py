@@ -0,0 +1,206 @@
+"""
+Lightweight tracing for the NinjaTranslate bot.
+
+Each update gets a trace; DB, Telegram API and translation calls made while
+handling it are recorded as spans. Traces slower than a threshold are
+sampled and appended to a rotated JSONL file by a background thread, so
+writing them never blocks the event loop.
+"""
+import functools
+import json
+import logging
+import queue
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Any, Awaitable, Callable, Dict
+from aiogram import BaseMiddleware
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.types import TelegramObject
+from config import config
+
+# Trace of the update being handled in the current task
+_current_trace: ContextVar = ContextVar("current_trace", default=None)
+
+# Slow trace log; records are queued here and written by _trace_listener's thread
+_trace_logger = logging.getLogger("ninjatranslate.traces")
+_trace_logger.setLevel(logging.INFO)
+_trace_logger.propagate = False
+_trace_listener = None
+
+class Trace:
+    """
+    Spans recorded while handling one update.
+    """
+
+    def __init__(self, name: str, **attributes):
+        self.name = name
+        self.attributes = attributes
+        self.started_at = datetime.now(timezone.utc)
+        self.started = time.perf_counter()
+        self.spans = []
+
+    def to_dict(self, duration: float) -> dict:
+        """
+        Serialize the trace for the slow trace log.
+
+        Args:
+            duration: Trace duration in seconds
+
+        Returns:
+            JSON-serializable trace
+        """
+        return {
+            "name": self.name,
+            "started_at": self.started_at.isoformat(),
+            "duration_ms": round(duration * 1000, 1),
+            **self.attributes,
+            "spans": self.spans
+        }
+
+@contextmanager
+def span(name: str):
+    """
+    Record a span in the current trace, if there is one.
+
+    Args:
+        name: Span name, e.g. "db.get_user"
+    """
+    trace = _current_trace.get()
+    if trace is None:
+        yield
+        return
+
+    started = time.perf_counter()
+    error = None
+    try:
+        yield
+    except BaseException as e:
+        error = type(e).__name__
+        raise
+    finally:
+        record = {
+            "name": name,
+            "start_ms": round((started - trace.started) * 1000, 1),
+            "duration_ms": round((time.perf_counter() - started) * 1000, 1)
+        }
+        if error:
+            record["error"] = error
+        trace.spans.append(record)
+
+def traced(prefix: str):
+    """
+    Decorate a coroutine function so each call is recorded as a span.
+
+    Args:
+        prefix: Span name prefix, the function name is appended
+
+    Returns:
+        Decorator
+    """
+    def decorator(func):
+        name = f"{prefix}.{func.__name__}"
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            with span(name):
+                return await func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+def _write_trace(record: dict):
+    """
+    Queue a trace for the slow trace log.
+
+    Args:
+        record: Serialized trace
+    """
+    _trace_logger.info(json.dumps(record, ensure_ascii=False))
+
+def _start_trace_log():
+    """
+    Start the thread writing the slow trace log.
+    """
+    global _trace_listener
+
+    if _trace_listener is not None:
+        return
+
+    handler = RotatingFileHandler(
+        config.trace_file,
+        maxBytes=config.trace_max_bytes,
+        backupCount=config.trace_backups,
+        encoding="utf-8",
+        delay=True
+    )
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    records = queue.SimpleQueue()
+    _trace_logger.addHandler(QueueHandler(records))
+    _trace_listener = QueueListener(records, handler)
+    _trace_listener.start()
+
+def stop_tracing():
+    """
+    Write the queued traces and stop the trace log thread.
+    """
+    global _trace_listener
+
+    if _trace_listener is None:
+        return
+    _trace_listener.stop()
+    _trace_listener = None
+    for handler in _trace_logger.handlers[:]:
+        _trace_logger.removeHandler(handler)
+
+class TracingMiddleware(BaseMiddleware):
+    """
+    Outer update middleware that traces the handling of each update.
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        user = data.get("event_from_user")
+        trace = Trace(
+            f"update.{event.event_type}",
+            update_id=event.update_id,
+            user_id=user.id if user else None
+        )
+        token = _current_trace.set(trace)
+        try:
+            return await handler(event, data)
+        finally:
+            _current_trace.reset(token)
+            duration = time.perf_counter() - trace.started
+            if duration >= config.trace_slow_threshold and random.random() < config.trace_sample_rate:
+                _write_trace(trace.to_dict(duration))
+
+class TelegramTracingMiddleware(BaseRequestMiddleware):
+    """
+    Bot session middleware that records Telegram API calls as spans.
+    """
+
+    async def __call__(self, make_request, bot, method):
+        with span(f"telegram.{type(method).__name__}"):
+            return await make_request(bot, method)
+
+def setup_tracing(dp, bots: list):
+    """
+    Enable tracing of updates and Telegram API calls.
+
+    Args:
+        dp: Dispatcher
+        bots: Telegram Bot instances
+    """
+    _start_trace_log()
+    dp.update.outer_middleware(TracingMiddleware())
+    for bot in bots:
+        bot.session.middleware(TelegramTracingMiddleware())
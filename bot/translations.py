@@ -1,10 +1,20 @@
 """
 Translation service for the NinjaTranslate bot.
 """
+import asyncio
+import difflib
 import json
 import logging
+import time
+from functools import lru_cache
 import aiohttp
 from config import config
+from bot.db import record_usage
+from bot.memory import memory, split_segments, join_segments
+from bot.masking import mask, unmask, placeholders_match, restore_missing, is_translatable
+from bot.tracing import traced
+from bot.admission import admission
+from bot.tasks import in_background
 
 # List of most common languages with emoji flags
 LANGUAGES = {
@@ -28,35 +38,108 @@ LANGUAGES = {
     "uk": "🇺🇦 Ukrainian"
 }
 
+# Reverse lookup of language codes by display name
+LANGUAGE_CODES = {lang_name: lang_code for lang_code, lang_name in LANGUAGES.items()}
+
+# Source language for texts whose language the model should detect itself
+AUTO_DETECT = "auto"
+
 # There are no predefined translation directions anymore
 # The user will select source and target languages separately
 TRANSLATIONS = {}
 
-# Localized language names for Arabic UI
-AR_LANG_NAMES = {
-    "🇬🇧 English": "🇬🇧 الإنجليزية",
-    "🇸🇦 Arabic": "🇸🇦 العربية",
-    "🇪🇸 Spanish": "🇪🇸 الإسبانية",
-    "🇫🇷 French": "🇫🇷 الفرنسية",
-    "🇩🇪 German": "🇩🇪 الألمانية",
-    "🇨🇳 Chinese": "🇨🇳 الصينية",
-    "🇷🇺 Russian": "🇷🇺 الروسية",
-    "🇵🇹 Portuguese": "🇵🇹 البرتغالية",
-    "🇯🇵 Japanese": "🇯🇵 اليابانية",
-    "🇮🇹 Italian": "🇮🇹 الإيطالية",
-    "🇰🇷 Korean": "🇰🇷 الكورية",
-    "🇹🇷 Turkish": "🇹🇷 التركية",
-    "🇳🇱 Dutch": "🇳🇱 الهولندية",
-    "🇸🇪 Swedish": "🇸🇪 السويدية",
-    "🇵🇱 Polish": "🇵🇱 البولندية",
-    "🇻🇳 Vietnamese": "🇻🇳 الفيتنامية",
-    "🇮🇳 Hindi": "🇮🇳 الهندية",
-    "🇺🇦 Ukrainian": "🇺🇦 الأوكرانية"
-}
+# Shared HTTP session, created lazily inside the running event loop
+_session = None
+
+def _get_session() -> aiohttp.ClientSession:
+    """
+    Get the shared HTTP session for X.AI API requests.
+    
+    Reusing one session keeps connections to the API alive between
+    requests instead of paying for a new TLS handshake every time.
+    
+    Returns:
+        Shared aiohttp client session
+    """
+    global _session
+    if _session is None or _session.closed:
+        _session = aiohttp.ClientSession()
+    return _session
+
+async def close_session():
+    """
+    Close the shared HTTP session.
+    """
+    global _session
+    if _session is not None and not _session.closed:
+        await _session.close()
+    _session = None
+
+def _language_name(lang: str) -> str:
+    """
+    Extract just the language name without the emoji.
+    
+    Args:
+        lang: Language name, optionally prefixed with a flag emoji
+        
+    Returns:
+        Plain language name
+    """
+    return lang.split(" ", 1)[1] if " " in lang else lang
 
-async def translate_text(text: str, source_lang: str, target_lang: str) -> str:
+@lru_cache(maxsize=None)
+def _base_prompt(source_lang: str, target_lang: str, style: str) -> str:
     """
-    Translate text using X.AI API.
+    Get the cached base system prompt for a language pair.
+    
+    Args:
+        source_lang: Source language, or AUTO_DETECT
+        target_lang: Target language
+        style: Prompt variant, "full" or "compact"
+        
+    Returns:
+        System prompt text without hints
+    """
+    source_name = _language_name(source_lang)
+    target_name = _language_name(target_lang)
+    
+    if source_lang == AUTO_DETECT:
+        if style == "compact":
+            return f"Translate to {target_name}. Output only the translation, keeping paragraph breaks and ⟦n⟧ placeholders unchanged."
+        return f"You are a professional translator. Translate the following text to {target_name}, whatever its language. Return only the translated text without explanations or additional comments and keep the paragraph breaks of the original. Keep placeholders such as ⟦0⟧ exactly as they are."
+    
+    if style == "compact":
+        return f"Translate {source_name} to {target_name}. Output only the translation, keeping paragraph breaks and ⟦n⟧ placeholders unchanged. If the language is unclear, output the text unchanged."
+    
+    return f"You are a professional translator. Translate the following text from {source_name} to {target_name}. Return only the translated text without explanations or additional comments and keep the paragraph breaks of the original. Keep placeholders such as ⟦0⟧ exactly as they are. If you can't identify the language, respond with the original text."
+
+def _build_system_prompt(source_lang: str, target_lang: str, hints: list) -> str:
+    """
+    Build the system prompt for a translation request.
+    
+    Args:
+        source_lang: Source language
+        target_lang: Target language
+        hints: Similar (source, translation, similarity) pairs from memory
+        
+    Returns:
+        System prompt text
+    """
+    prompt = _base_prompt(source_lang, target_lang, config.prompt_style)
+    
+    if hints:
+        prompt += "\n\nTranslations of similar passages for reference. Reuse their wording where it fits, but translate the new text exactly:"
+        for hint_source, hint_translation, _ in hints:
+            prompt += f"\n\nSource: {hint_source}\nTranslation: {hint_translation}"
+    
+    return prompt
+
+def _select_tiers(text: str, source_lang: str, target_lang: str) -> list:
+    """
+    Choose the model tiers to try for a request.
+    
+    The first tier whose length limit and language pairs fit the request
+    is tried first, the tiers after it are the fallbacks.
     
     Args:
         text: Text to translate
@@ -64,45 +147,84 @@ async def translate_text(text: str, source_lang: str, target_lang: str) -> str:
         target_lang: Target language
         
     Returns:
-        Translated text
+        Model tiers in the order to try them
+    """
+    pair = (LANGUAGE_CODES.get(source_lang, source_lang), LANGUAGE_CODES.get(target_lang, target_lang))
+    
+    for index, tier in enumerate(config.model_tiers):
+        if tier.max_chars is not None and len(text) > tier.max_chars:
+            continue
+        if tier.languages and not all(code in tier.languages for code in pair):
+            continue
+        return config.model_tiers[index:]
+    
+    return config.model_tiers[-1:]
+
+@traced("xai")
+async def _request_translation(text: str, source_lang: str, target_lang: str, hints: list = None) -> tuple:
+    """
+    Send a single translation request to X.AI API.
+    
+    The request goes to the model tier chosen by input length and language
+    pair and falls back to the next tier when a tier times out.
+    
+    Args:
+        text: Text to translate
+        source_lang: Source language
+        target_lang: Target language
+        hints: Optional similar segments from translation memory
+        
+    Returns:
+        Tuple of (translated text, usage dictionary)
         
     Raises:
         Exception: If translation fails
     """
-    # Extract just the language name without the emoji
-    source_lang_name = source_lang.split(" ", 1)[1] if " " in source_lang else source_lang
-    target_lang_name = target_lang.split(" ", 1)[1] if " " in target_lang else target_lang
-    
     headers = {
         "Authorization": f"Bearer {config.xai_api_key}",
         "Content-Type": "application/json"
     }
     
-    payload = {
-        "model": "grok-3-latest",
-        "messages": [
-            {
-                "role": "system",
-                "content": f"You are a professional translator. Translate the following text from {source_lang_name} to {target_lang_name}. Return only the translated text without explanations or additional comments. If you can't identify the language, respond with the original text."
-            },
-            {
-                "role": "user",
-                "content": text
-            }
-        ],
-        "temperature": 0.3,
-        "stream": False
-    }
+    messages = [
+        {
+            "role": "system",
+            "content": _build_system_prompt(source_lang, target_lang, hints)
+        },
+        {
+            "role": "user",
+            "content": text
+        }
+    ]
     
-    async with aiohttp.ClientSession() as session:
+    session = _get_session()
+    for tier in _select_tiers(text, source_lang, target_lang):
+        payload = {
+            "model": tier.model,
+            "messages": messages,
+            "temperature": tier.temperature,
+            "stream": False
+        }
+        
         try:
-            async with session.post(config.xai_api_url, headers=headers, json=payload) as response:
+            async with session.post(
+                config.xai_api_url,
+                headers=headers,
+                json=payload,
+                timeout=aiohttp.ClientTimeout(total=tier.timeout)
+            ) as response:
                 if response.status != 200:
                     error_text = await response.text()
                     raise Exception(f"API error: {response.status}, {error_text}")
                 
                 result = await response.json()
-                return result["choices"][0]["message"]["content"]
+                usage = result.get("usage") or {}
+                return result["choices"][0]["message"]["content"], {
+                    "prompt_tokens": usage.get("prompt_tokens", 0),
+                    "completion_tokens": usage.get("completion_tokens", 0)
+                }
+        except asyncio.TimeoutError:
+            logging.warning(f"Model tier {tier.name} timed out after {tier.timeout}s")
+            continue
         except aiohttp.ClientError as e:
             logging.error(f"HTTP request error: {e}")
             raise Exception("Network error while connecting to translation service")
@@ -111,4 +233,241 @@ async def translate_text(text: str, source_lang: str, target_lang: str) -> str:
             raise Exception("Error parsing translation response")
         except Exception as e:
             logging.error(f"Unexpected error: {e}")
-            raise Exception("Unexpected error during translation") 
\ No newline at end of file
+            raise Exception("Unexpected error during translation")
+    
+    raise Exception("Translation service timed out")
+
+def _record_usage(user_id: int, source_lang: str, target_lang: str, prompt_tokens: int, completion_tokens: int, started: float, memory_hit: bool = False):
+    """
+    Record token usage and latency of a translation in the background.
+    
+    Args:
+        user_id: Telegram user ID the translation was made for
+        source_lang: Source language
+        target_lang: Target language
+        prompt_tokens: Prompt tokens spent
+        completion_tokens: Completion tokens spent
+        started: time.monotonic() value when the translation started
+        memory_hit: Whether the translation was served entirely from the translation memory
+    """
+    latency_ms = int((time.monotonic() - started) * 1000)
+    in_background(record_usage(
+        user_id,
+        LANGUAGE_CODES.get(source_lang, source_lang),
+        LANGUAGE_CODES.get(target_lang, target_lang),
+        prompt_tokens,
+        completion_tokens,
+        latency_ms,
+        memory_hit
+    ))
+
+async def _admitted_request(text: str, source_lang: str, target_lang: str, hints: list = None) -> tuple:
+    """
+    Send a translation request once the admission controller admits it.
+    
+    Each upstream request holds its own slot, the controller rejects
+    requests while the upstream is unhealthy or the bot is saturated.
+    
+    Args:
+        text: Text to translate
+        source_lang: Source language
+        target_lang: Target language
+        hints: Optional similar segments from translation memory
+        
+    Returns:
+        Tuple of (translated text, usage dictionary)
+        
+    Raises:
+        Overloaded: If the request is not admitted
+        Exception: If translation fails
+    """
+    async with admission.admit():
+        try:
+            result = await _request_translation(text, source_lang, target_lang, hints)
+        except Exception:
+            admission.record_result(False)
+            raise
+        admission.record_result(True)
+        return result
+
+@traced("translate")
+async def translate_segments(segments: list, source_lang: str, target_lang: str, user_id: int = None) -> list:
+    """
+    Translate a list of segments, reusing the translation memory where possible.
+    
+    URLs, mentions, code, emoji and numbers are masked with placeholders
+    numbered per segment, so the memory matches segments that differ only
+    in those spans. Segments with nothing left to translate are returned
+    as-is. Segments already in memory are reused, close matches are passed
+    to the model as hints and only novel segments are sent to X.AI API,
+    together in a single request. Token usage and latency are recorded
+    per user and language pair.
+    
+    Args:
+        segments: Source segments without blank lines inside them
+        source_lang: Source language
+        target_lang: Target language
+        user_id: Telegram user ID for usage accounting
+        
+    Returns:
+        List of translated segments in the same order
+        
+    Raises:
+        Exception: If translation fails
+    """
+    started = time.monotonic()
+    masked = [mask(segment) for segment in segments]
+    sources = [masked_segment for masked_segment, _ in masked]
+    translations = []
+    novel = []
+    
+    for index, (segment, spans) in enumerate(masked):
+        translation = segment if not is_translatable(segment) else memory.lookup(source_lang, target_lang, segment)
+        if translation is None:
+            novel.append(index)
+        else:
+            translation = unmask(translation, spans)
+        translations.append(translation)
+    
+    if not novel:
+        logging.info(f"Translation memory hit: {len(segments)} segment(s)")
+        _record_usage(user_id, source_lang, target_lang, 0, 0, started, memory_hit=True)
+        return translations
+    
+    if len(novel) < len(segments):
+        logging.info(f"Translation memory hit: {len(segments) - len(novel)}/{len(segments)} segment(s)")
+    
+    suggestions = [memory.suggest(source_lang, target_lang, sources[index]) for index in novel]
+    hints = [hint for hint in suggestions if hint][:config.memory_max_hints]
+    
+    # Translate all novel segments in one request, one paragraph per segment
+    translated, usage = await _admitted_request(
+        "\n\n".join(sources[index].strip() for index in novel),
+        source_lang,
+        target_lang,
+        hints
+    )
+    results = [(translated, usage)]
+    
+    translated_segments, _ = split_segments(translated)
+    if len(novel) == 1:
+        translated_segments = [translated.strip()]
+    elif len(translated_segments) != len(novel):
+        # The model merged or split paragraphs, fall back to one request per segment
+        logging.warning(f"Segment count mismatch ({len(translated_segments)}/{len(novel)}), translating separately")
+        retries = await asyncio.gather(*(
+            _admitted_request(
+                sources[index],
+                source_lang,
+                target_lang,
+                [suggestion] if suggestion else None
+            )
+            for index, suggestion in zip(novel, suggestions)
+        ))
+        results.extend(retries)
+        translated_segments = [result.strip() for result, _ in retries]
+    
+    for index, translation in zip(novel, translated_segments):
+        if placeholders_match(sources[index], translation):
+            translations[index] = unmask(translation, masked[index][1])
+            # An unchanged text usually means the source was in another language, don't remember it
+            if translation.strip() != sources[index].strip():
+                memory.store(source_lang, target_lang, sources[index], translation)
+        else:
+            translations[index] = restore_missing(translation, masked[index][1])
+    
+    _record_usage(
+        user_id,
+        source_lang,
+        target_lang,
+        sum(usage["prompt_tokens"] for _, usage in results),
+        sum(usage["completion_tokens"] for _, usage in results),
+        started
+    )
+    return translations
+
+async def retranslate_segments(old_segments: list, old_translations: list, segments: list, source_lang: str, target_lang: str, user_id: int = None) -> list:
+    """
+    Translate an edited text, reusing translations of unchanged segments.
+    
+    The old and new segments are diffed and only inserted or changed
+    segments are translated, together in a single request.
+    
+    Args:
+        old_segments: Segments of the text before the edit
+        old_translations: Translations of old_segments
+        segments: Segments of the edited text
+        source_lang: Source language
+        target_lang: Target language
+        user_id: Telegram user ID for usage accounting
+        
+    Returns:
+        List of translated segments of the edited text
+        
+    Raises:
+        Exception: If translation fails
+    """
+    translations = [None] * len(segments)
+    changed = []
+    
+    matcher = difflib.SequenceMatcher(a=old_segments, b=segments, autojunk=False)
+    for tag, old_start, old_end, start, end in matcher.get_opcodes():
+        if tag == "equal":
+            translations[start:end] = old_translations[old_start:old_end]
+        else:
+            changed.extend(range(start, end))
+    
+    if changed:
+        logging.info(f"Re-translating {len(changed)}/{len(segments)} edited segment(s)")
+        changed_translations = await translate_segments([segments[index] for index in changed], source_lang, target_lang, user_id)
+        for index, translation in zip(changed, changed_translations):
+            translations[index] = translation
+    
+    return translations
+
+def lookup_translation(text: str, source_lang: str, target_lang: str):
+    """
+    Get a translation from memory without calling the API.
+    
+    Args:
+        text: Text to translate
+        source_lang: Source language
+        target_lang: Target language
+        
+    Returns:
+        Translated text if every segment is in memory, None otherwise
+    """
+    segments, separators = split_segments(text)
+    translations = []
+    
+    for segment in segments:
+        masked_segment, spans = mask(segment)
+        translation = masked_segment if not is_translatable(masked_segment) else memory.lookup(source_lang, target_lang, masked_segment)
+        if translation is None:
+            return None
+        translations.append(unmask(translation, spans))
+    
+    return join_segments(translations, separators)
+
+async def translate_text(text: str, source_lang: str, target_lang: str, user_id: int = None) -> str:
+    """
+    Translate text paragraph by paragraph through the translation memory.
+    
+    Cancelling the call aborts the in-flight API request, so superseded
+    translations stop spending tokens.
+    
+    Args:
+        text: Text to translate
+        source_lang: Source language
+        target_lang: Target language
+        user_id: Telegram user ID for usage accounting
+        
+    Returns:
+        Translated text
+        
+    Raises:
+        Exception: If translation fails
+    """
+    segments, separators = split_segments(text)
+    translations = await translate_segments(segments, source_lang, target_lang, user_id)
+    return join_segments(translations, separators)
@@ -1,12 +1,57 @@
+import json
 import os
 from dotenv import load_dotenv
 from pydantic import BaseModel, Field
-from typing import List
+from typing import List, Optional
 
 load_dotenv()
 
+class ModelTier(BaseModel):
+    """
+    Translation model used for inputs up to a length and, optionally, for some language pairs.
+    """
+    name: str
+    model: str
+    # Longest input in characters, None for any length
+    max_chars: Optional[int] = None
+    # Language codes both sides of the pair must be in, empty for any pair
+    languages: List[str] = []
+    temperature: float = 0.3
+    # Seconds to wait before falling back to the next tier
+    timeout: float = 30.0
+
+# Fast model for short texts in common pairs, full model for everything else
+DEFAULT_MODEL_TIERS = [
+    {
+        "name": "fast",
+        "model": os.getenv("XAI_FAST_MODEL", "grok-3-mini-fast"),
+        "max_chars": 300,
+        "languages": ["en", "ar", "es", "fr", "de", "ru", "pt", "it", "uk"],
+        "timeout": 6.0
+    },
+    {
+        "name": "full",
+        "model": os.getenv("XAI_MODEL", "grok-3-latest"),
+        "timeout": 45.0
+    }
+]
+
+# Channels users must join, for bots that do not set their own
+DEFAULT_CHANNELS = [os.getenv("CHANNEL_ID_1", ""), os.getenv("CHANNEL_ID_2", "")]
+
+class BotConfig(BaseModel):
+    """
+    Telegram bot hosted by this process.
+    """
+    token: str
+    # Prefix of the bot's MongoDB collections, empty for the unprefixed collections
+    namespace: str = ""
+    required_channels: List[str] = Field(default_factory=lambda: list(DEFAULT_CHANNELS))
+    
+    def validate_channels(self) -> bool:
+        return all(self.required_channels)
+
 class Config(BaseModel):
-    bot_token: str = Field(default=os.getenv("BOT_TOKEN"))
     xai_api_key: str = Field(default=os.getenv("XAI_API_KEY"))
     xai_api_url: str = Field(default="https://api.x.ai/v1/chat/completions")
     
@@ -14,21 +59,116 @@ class Config(BaseModel):
     mongo_uri: str = Field(default=os.getenv("MONGO_URI", "mongodb://localhost:27017"))
     mongo_db: str = Field(default=os.getenv("MONGO_DB", "ninja_translate_bot"))
     
-    # Subscription settings
-    required_channels: List[str] = Field(
-        default=[
-            os.getenv("CHANNEL_ID_1", ""),
-            os.getenv("CHANNEL_ID_2", "")
-        ]
+    # Data retention in days, 0 keeps data forever
+    user_retention_days: int = Field(default=int(os.getenv("USER_RETENTION_DAYS", "0")))
+    usage_log_retention_days: int = Field(default=int(os.getenv("USAGE_LOG_RETENTION_DAYS", "30")))
+    
+    # Bots hosted by this process; BOTS overrides the single BOT_TOKEN bot with a JSON list
+    bots: List[BotConfig] = Field(
+        default=[BotConfig(**bot) for bot in json.loads(os.getenv("BOTS") or "null") or [{"token": os.getenv("BOT_TOKEN") or ""}]]
     )
     
+    # Subscription settings
+    # Track subscriptions with chat_member updates, the bot must be an admin of the channels
+    subscription_events: bool = Field(default=os.getenv("SUBSCRIPTION_EVENTS", "0") == "1")
+    
+    # Hours after which memberships stored from chat_member updates are checked live again
+    subscription_recheck_hours: int = Field(default=24)
+    
     # Time in minutes to recheck subscription status
     subscription_check_interval: int = Field(default=60)
     
-    def validate_tokens(self) -> bool:
-        return bool(self.bot_token) and bool(self.xai_api_key)
+    # Seconds to remember a failed subscription check, and verdict cache size
+    subscription_negative_ttl: int = Field(default=30)
+    subscription_cache_size: int = Field(default=100000)
     
-    def validate_channels(self) -> bool:
-        return all(self.required_channels)
+    # Translation memory settings
+    memory_max_segments: int = Field(default=int(os.getenv("MEMORY_MAX_SEGMENTS", "5000")))
+    memory_fuzzy_threshold: float = Field(default=float(os.getenv("MEMORY_FUZZY_THRESHOLD", "0.5")))
+    memory_max_hints: int = Field(default=3)
+    
+    # Model tiers, tried in order; MODEL_TIERS overrides them with a JSON list
+    model_tiers: List[ModelTier] = Field(
+        default=[ModelTier(**tier) for tier in json.loads(os.getenv("MODEL_TIERS") or "null") or DEFAULT_MODEL_TIERS]
+    )
+    
+    # System prompt variant: "full" or "compact"
+    prompt_style: str = Field(default=os.getenv("PROMPT_STYLE", "full"))
+    
+    # Longest text users can translate in one message
+    max_text_length: int = Field(default=2000)
+    
+    # Admission control: upstream requests in flight, share for background work, queue length and wait in seconds
+    admission_max_in_flight: int = Field(default=int(os.getenv("ADMISSION_MAX_IN_FLIGHT", "32")))
+    admission_background_share: float = Field(default=0.5)
+    admission_max_queue: int = Field(default=200)
+    admission_max_queue_age: float = Field(default=15.0)
+    
+    # Queue length and wait in seconds for background work such as documents and group batches
+    admission_max_background_queue: int = Field(default=500)
+    admission_max_background_age: float = Field(default=300.0)
+    
+    # Consecutive upstream failures that switch to cache-only mode, and for how many seconds
+    degraded_failures: int = Field(default=5)
+    degraded_cooldown: int = Field(default=30)
+    
+    # Group mode: seconds to cache chat settings, to collect a burst, and messages per batch
+    group_settings_ttl: int = Field(default=300)
+    group_batch_delay: float = Field(default=2.0)
+    group_batch_size: int = Field(default=10)
+    
+    # Number of translated messages whose replies are updated when the message is edited
+    reply_records_size: int = Field(default=10000)
+    
+    # Channel post pre-translation: language pairs, seconds between pair refreshes, parallel posts
+    pretranslate_pairs: int = Field(default=3)
+    pretranslate_refresh: int = Field(default=3600)
+    pretranslate_concurrency: int = Field(default=1)
+    
+    # Maximum number of target languages for one message
+    max_target_languages: int = Field(default=6)
+    
+    # Outbound message rates per second: whole bot, private chat, group or channel
+    sender_global_rate: float = Field(default=30.0)
+    sender_chat_rate: float = Field(default=1.0)
+    sender_group_rate: float = Field(default=20 / 60)
+    sender_chat_burst: int = Field(default=3)
+    sender_max_retries: int = Field(default=5)
+    sender_max_chats: int = Field(default=10000)
+    
+    # Broadcast settings: bulk messages per second, users per checkpoint
+    broadcast_rate: float = Field(default=25.0)
+    broadcast_batch_size: int = Field(default=100)
+    
+    # Inline mode settings: seconds to wait for the user to stop typing
+    inline_debounce: float = Field(default=0.4)
+    inline_cache_time: int = Field(default=300)
+    
+    # Document translation settings
+    document_max_size: int = Field(default=20 * 1024 * 1024)
+    document_batch_chars: int = Field(default=1500)
+    document_concurrency: int = Field(default=4)
+    
+    # Tracing settings: traces slower than the threshold (seconds) are sampled into the file
+    trace_file: str = Field(default=os.getenv("TRACE_FILE", "traces.jsonl"))
+    trace_slow_threshold: float = Field(default=float(os.getenv("TRACE_SLOW_THRESHOLD", "1.0")))
+    trace_sample_rate: float = Field(default=float(os.getenv("TRACE_SAMPLE_RATE", "0.05")))
+    # Size in bytes at which the trace file is rotated, and rotated files kept
+    trace_max_bytes: int = Field(default=10 * 1024 * 1024)
+    trace_backups: int = Field(default=3)
+    
+    # Sampling profiler settings: default and maximum duration, seconds between samples
+    profile_duration: int = Field(default=10)
+    profile_max_duration: int = Field(default=120)
+    profile_interval: float = Field(default=0.005)
+    
+    def validate_tokens(self) -> bool:
+        namespaces = {bot.namespace for bot in self.bots}
+        return (
+            bool(self.bots)
+            and all(bot.token for bot in self.bots)
+            and len(namespaces) == len(self.bots)
+            and bool(self.xai_api_key)
+        )
 
 config = Config() 
\ No newline at end of file
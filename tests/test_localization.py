@@ -0,0 +1,28 @@
+"""
+Tests for the locale resource files of the NinjaTranslate bot.
+"""
+from bot.localization import (
+    DEFAULT_LANG,
+    MESSAGES,
+    UI_LANGUAGES,
+    _LOCALES,
+    _compile_messages,
+    find_placeholder_mismatches
+)
+
+def test_locales_use_the_default_placeholders():
+    assert find_placeholder_mismatches(_LOCALES) == []
+
+def test_every_language_has_every_message():
+    keys = {key for lang, key in MESSAGES if lang == DEFAULT_LANG}
+    for lang in UI_LANGUAGES:
+        assert {key for message_lang, key in MESSAGES if message_lang == lang} == keys
+
+def test_mismatched_translation_falls_back_to_default_language():
+    locales = {
+        DEFAULT_LANG: {"messages": {**_LOCALES[DEFAULT_LANG]["messages"], "greeting": "Hello, {name}!"}},
+        "xx": {"messages": {"greeting": "Hallo, {nme}!"}}
+    }
+    table = _compile_messages(locales)
+    assert table[("xx", "greeting")] == "Hello, {name}!"
+    assert find_placeholder_mismatches(locales) == [("xx", "greeting")]